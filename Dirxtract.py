@@ -1,29 +1,567 @@
 import sys
 import os
+import bisect
 import json
-import fnmatch
+import shutil
+import tempfile
+import time
 from PyQt5.QtWidgets import (
     QApplication, QWidget, QVBoxLayout, QPushButton, QFileDialog,
-    QLineEdit, QTreeWidget, QTreeWidgetItem, QMessageBox, QLabel, QHBoxLayout,
-    QTextEdit, QDialog, QDialogButtonBox, QListWidget, QInputDialog
+    QLineEdit, QTreeView, QMessageBox, QLabel, QHBoxLayout,
+    QPlainTextEdit, QDialog, QDialogButtonBox, QListWidget, QInputDialog, QCheckBox,
+    QProgressDialog, QSpinBox, QComboBox, QCompleter
 )
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import (
+    Qt, QAbstractItemModel, QFileSystemWatcher, QModelIndex, QObject, QThread, QTimer, pyqtSignal
+)
+from PyQt5.QtGui import QTextCursor
+
+from dirxtract_core import (
+    BUDGET_STRATEGIES, CONFIG_DIR, DEFAULT_GLOBAL_IGNORES, PROFILE_ENV, DirectorySnapshot, ExportIndex,
+    ExportProfile, IgnoreMatcher, SelectionModel, TokenEstimator, ReadLimits, WalkLimits,
+    get_global_ignore_path, get_settings_path, load_global_ignores, load_settings, read_export_contents,
+    select_export_files, write_export
+)
+from dirxtract_cache import ScanCache
+
+# Tree view columns
+SELECT_COLUMN = 0
+NAME_COLUMN = 1
+SIZE_COLUMN = 2
+TOKENS_COLUMN = 3
+TREE_HEADERS = ["Select", "Name", "Size", "Tokens"]
+
+# What a TreeWorker produces
+MODE_TREE = 'tree'
+MODE_EXPORT = 'export'
+MODE_TOTALS = 'totals'
+
+# Exports larger than this ask before being copied to the clipboard as a whole
+COPY_CONFIRM_BYTES = 64 * 1024 * 1024
+
+def format_size(size):
+    """Format a byte count for display."""
+    for unit in ("B", "KB", "MB"):
+        if size < 1024:
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GB"
+
+def format_tokens(tokens):
+    """Format an estimated token count for display."""
+    if tokens < 1000:
+        return str(tokens)
+    if tokens < 1000000:
+        return f"{tokens / 1000:.1f}k"
+    return f"{tokens / 1000000:.2f}M"
+
+class ScanCancelled(Exception):
+    """Raised inside a worker thread to abandon a walk that was cancelled."""
+
+class TreeWorker(QThread):
+    """Background thread that walks the snapshot and optionally reads file contents.
+
+    Progress is reported through signals so the GUI thread stays responsive,
+    and the walk stops early once requestInterruption() has been called.
+    """
+    progress = pyqtSignal(int, int, str)  # files done, bytes read, current path
+    total_files = pyqtSignal(int)
+    tree_ready = pyqtSignal(str)  # tree text
+    # ExportIndex of the streamed export file, character count, files dropped, ExportProfile
+    export_ready = pyqtSignal(object, int, int, object)
+    totals_ready = pyqtSignal()
+    failed = pyqtSignal(str)
+
+    # Minimum seconds between progress signals, to avoid flooding the event loop
+    PROGRESS_INTERVAL = 0.05
+
+    def __init__(self, snapshot, relative_root, selection, mode, read_workers, estimator,
+                 token_budget=0, budget_strategy='largest', low_priority=None, limits=None, dedupe=False,
+                 parent=None):
+        super().__init__(parent)
+        self.snapshot = snapshot
+        self.relative_root = relative_root
+        self.selection = selection
+        self.mode = mode
+        self.read_workers = read_workers
+        self.estimator = estimator
+        self.token_budget = token_budget
+        self.budget_strategy = budget_strategy
+        self.low_priority = low_priority
+        self.limits = limits
+        self.dedupe = dedupe
+        self.last_progress = 0.0
+
+    def report(self, files_done, bytes_read, path, force=False):
+        """Emit a progress signal, throttled to PROGRESS_INTERVAL."""
+        now = time.monotonic()
+        if force or now - self.last_progress >= self.PROGRESS_INTERVAL:
+            self.last_progress = now
+            self.progress.emit(files_done, bytes_read, path)
+
+    def on_listing(self, path):
+        """Snapshot listing hook: report the directory and honour cancellation."""
+        if self.isInterruptionRequested():
+            raise ScanCancelled()
+        self.report(0, 0, path)
+
+    def track_contents(self, contents, total):
+        """Pass file contents through while reporting progress and honouring cancellation."""
+        bytes_read = 0
+        for files_done, (rel_path, content, size) in enumerate(contents, 1):
+            if self.isInterruptionRequested():
+                contents.close()
+                raise ScanCancelled()
+            bytes_read += size
+            self.report(files_done, bytes_read, rel_path, force=files_done == total)
+            yield rel_path, content, size
+
+    def save_cache(self):
+        """Persist the scan cache, if any, before results are handed back to the GUI thread."""
+        if self.snapshot.cache is None:
+            return
+        try:
+            self.snapshot.cache.save()
+        except OSError as e:
+            print(f"Failed to save scan cache: {e}")
+
+    def run(self):
+        self.snapshot.listing_callback = self.on_listing
+        profile = ExportProfile()
+        self.snapshot.profile = profile
+        export_path = None
+        try:
+            if self.mode == MODE_TOTALS:
+                self.snapshot.compute_totals(self.snapshot.root, self.estimator, self.limits)
+                self.save_cache()
+                self.totals_ready.emit()
+                return
+            lines, files_dict, dropped = select_export_files(
+                self.snapshot, self.relative_root, self.selection,
+                self.token_budget if self.mode == MODE_EXPORT else 0, self.budget_strategy,
+                self.low_priority, self.limits, self.estimator
+            )
+            if self.mode == MODE_TREE:
+                self.save_cache()
+                self.tree_ready.emit("\n".join(lines))
+                return
+            self.total_files.emit(len(files_dict))
+            # Stream the export to a temporary file; ExportOutputDialog deletes it when closed
+            fd, export_path = tempfile.mkstemp(prefix="dirxtract_", suffix=".txt")
+            with open(fd, 'w', encoding='utf-8', newline='') as out:
+                contents = read_export_contents(files_dict, self.read_workers, self.snapshot.cache, self.limits,
+                                                profile, self.dedupe)
+                char_count = write_export(out, "\n".join(lines), self.track_contents(contents, len(files_dict)),
+                                          profile)
+            self.save_cache()
+            if os.environ.get(PROFILE_ENV):
+                try:
+                    profile.save(os.environ[PROFILE_ENV], self.snapshot.root.path)
+                except OSError as e:
+                    print(f"Failed to save export profile: {e}")
+            if not self.isInterruptionRequested():
+                index = ExportIndex(export_path, list(files_dict))
+                self.export_ready.emit(index, char_count, len(dropped), profile)
+                export_path = None
+        except ScanCancelled:
+            pass
+        except Exception as e:
+            self.failed.emit(str(e))
+        finally:
+            self.snapshot.listing_callback = None
+            self.snapshot.profile = None
+            if export_path is not None:
+                try:
+                    os.remove(export_path)
+                except OSError:
+                    pass
+
+class ListingWorker(QThread):
+    """Background thread that lists one directory of the snapshot for the tree view."""
+    listed = pyqtSignal(object)  # the ScanNode that was listed
+
+    def __init__(self, snapshot, node, parent=None):
+        super().__init__(parent)
+        self.snapshot = snapshot
+        self.node = node
+
+    def run(self):
+        try:
+            self.snapshot.list_children(self.node)
+        except Exception as e:
+            # Includes ScanCancelled from a TreeWorker's listing callback; the view retries on next expand
+            print(f"Failed to list {self.node.path}: {e}")
+        self.listed.emit(self.node)
+
+class SnapshotTreeModel(QAbstractItemModel):
+    """Item model over a DirectorySnapshot with checkable, lazily listed rows.
+
+    Each index points straight at its ScanNode, so the model keeps no per-row
+    objects of its own. Directories are listed on a ListingWorker the first
+    time they are expanded, and their rows are handed to the view FETCH_BATCH
+    at a time as it scrolls. Check states come from the SelectionModel.
+    Selected token counts are uniform below a mark, so only directories with
+    newer marks below them have an entry in selected_tokens.
+    """
+    # Rows inserted per fetchMore() call
+    FETCH_BATCH = 1000
+
+    selected_tokens_changed = pyqtSignal(int)
+    directory_shown = pyqtSignal(str)  # a directory's listing is now in the view
+    directory_hidden = pyqtSignal(str)  # a shown directory disappeared from disk
+
+    def __init__(self, snapshot, selection, parent=None):
+        super().__init__(parent)
+        self.snapshot = snapshot
+        self.selection = selection
+        self.shown = {}  # path -> directory node whose listing the view has
+        self.fetched = {}  # directory node -> number of rows inserted so far
+        self.listing = {}  # directory node -> ListingWorker listing it
+        self.selected_tokens = {}  # directory node -> selected tokens, where not uniform
+
+    def node(self, index):
+        return index.internalPointer() if index.isValid() else None
+
+    def index_for(self, node, column=0):
+        """Return the index of a node, or an invalid index for nodes above the root."""
+        if node is None:
+            return QModelIndex()
+        return self.createIndex(node.row, column, node)
+
+    def index(self, row, column, parent=QModelIndex()):
+        if not self.hasIndex(row, column, parent):
+            return QModelIndex()
+        if not parent.isValid():
+            return self.createIndex(row, column, self.snapshot.root)
+        return self.createIndex(row, column, parent.internalPointer().children[row])
 
-# Directory to store configuration for global ignore patterns only
-CONFIG_DIR = 'config'
-GLOBAL_IGNORE_FILE = 'global_ignore.json'
+    def parent(self, index):
+        node = self.node(index)
+        if node is None or node.parent is None:
+            return QModelIndex()
+        return self.index_for(node.parent)
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.column() > 0:
+            return 0
+        if not parent.isValid():
+            return 1
+        return self.fetched.get(parent.internalPointer(), 0)
+
+    def columnCount(self, parent=QModelIndex()):
+        return len(TREE_HEADERS)
+
+    def hasChildren(self, parent=QModelIndex()):
+        node = self.node(parent)
+        if node is None:
+            return True
+        if not node.is_dir:
+            return False
+        return node.children is None or len(node.children) > 0
+
+    def canFetchMore(self, parent):
+        node = self.node(parent)
+        if node is None or not node.is_dir or node in self.listing:
+            return False
+        return node.children is None or self.fetched.get(node, 0) < len(node.children)
+
+    def fetchMore(self, parent):
+        node = self.node(parent)
+        if node is None:
+            return
+        if node.children is None:
+            worker = ListingWorker(self.snapshot, node, self)
+            worker.listed.connect(self.on_listed)
+            self.listing[node] = worker
+            worker.start()
+            return
+        if node.path not in self.shown:
+            self.shown[node.path] = node
+            self.directory_shown.emit(node.path)
+        done = self.fetched.get(node, 0)
+        count = min(self.FETCH_BATCH, len(node.children) - done)
+        if count <= 0:
+            return
+        self.beginInsertRows(parent, done, done + count - 1)
+        self.fetched[node] = done + count
+        self.endInsertRows()
+
+    def on_listed(self, node):
+        """Insert the first batch of rows once a ListingWorker has listed a directory."""
+        worker = self.listing.pop(node, None)
+        if worker is not None:
+            # listed is the last thing run() does, so this returns almost immediately
+            worker.wait()
+            worker.deleteLater()
+        if node.children is not None and self.is_attached(node):
+            if node.note:
+                index = self.index_for(node, NAME_COLUMN)
+                self.dataChanged.emit(index, index)
+            self.fetchMore(self.index_for(node))
+
+    def is_attached(self, node):
+        """Return False for nodes under a directory that was removed by rescan()."""
+        while node.parent is not None:
+            if node.row >= len(node.parent.children) or node.parent.children[node.row] is not node:
+                return False
+            node = node.parent
+        return True
+
+    def rescan(self, node):
+        """Apply a shown directory's changes on disk to its rows, leaving the rest of the tree alone."""
+        if node.children is None or node in self.listing:
+            return
+        children = self.snapshot.rescan(node)
+        kept = set(children)
+        parent = self.index_for(node)
+        for row in range(len(node.children) - 1, -1, -1):
+            child = node.children[row]
+            if child in kept:
+                continue
+            self.forget(child)
+            shown = row < self.fetched.get(node, 0)
+            if shown:
+                self.beginRemoveRows(parent, row, row)
+                self.fetched[node] -= 1
+            del node.children[row]
+            self.renumber(node, row)
+            if shown:
+                self.endRemoveRows()
+        # What is left is in the same order as children, so the new entries just slot in
+        for row, child in enumerate(children):
+            if row < len(node.children) and node.children[row] is child:
+                continue
+            done = self.fetched.get(node, 0)
+            shown = row < done or done == len(node.children)
+            if shown:
+                self.beginInsertRows(parent, row, row)
+                self.fetched[node] = done + 1
+            node.children.insert(row, child)
+            self.renumber(node, row)
+            if shown:
+                self.endInsertRows()
+
+    def renumber(self, node, start):
+        """Update the row numbers of a directory's children from start onwards."""
+        children = node.children
+        for row in range(start, len(children)):
+            children[row].row = row
+
+    def forget(self, node):
+        """Drop everything kept about a node that disappeared from disk, and what was below it."""
+        prefix = os.path.join(node.path, '')
+        for path in [path for path in self.shown if path == node.path or path.startswith(prefix)]:
+            directory = self.shown.pop(path)
+            self.fetched.pop(directory, None)
+            self.selected_tokens.pop(directory, None)
+            self.directory_hidden.emit(path)
+        if self.snapshot.cache is not None:
+            self.snapshot.cache.forget(node.path)
+
+    def totals_invalidated(self):
+        """Stop showing token totals that no longer add up after a rescan."""
+        self.selected_tokens = {}
+        self.refresh(self.snapshot.root)
+
+    def wait_for_listings(self):
+        """Block until every ListingWorker has stopped, before the model is discarded."""
+        for worker in list(self.listing.values()):
+            worker.wait()
+        self.listing.clear()
+
+    def flags(self, index):
+        if not index.isValid():
+            return Qt.NoItemFlags
+        flags = Qt.ItemIsEnabled | Qt.ItemIsSelectable
+        if index.column() == SELECT_COLUMN:
+            flags |= Qt.ItemIsUserCheckable
+        return flags
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return TREE_HEADERS[section]
+        return None
+
+    def data(self, index, role=Qt.DisplayRole):
+        node = self.node(index)
+        if node is None:
+            return None
+        column = index.column()
+        if role == Qt.CheckStateRole and column == SELECT_COLUMN:
+            return Qt.Checked if self.selection.is_selected(node.path) else Qt.Unchecked
+        if role != Qt.DisplayRole:
+            return None
+        if column == NAME_COLUMN:
+            name = node.name or node.path
+            return f"{name}  [{node.note}]" if node.note else name
+        if node.tokens is None:
+            return None
+        if column == SIZE_COLUMN:
+            return format_size(node.size)
+        if column == TOKENS_COLUMN:
+            selected = self.selected_tokens_of(node)
+            if selected == node.tokens:
+                return format_tokens(node.tokens)
+            return f"{format_tokens(selected)} / {format_tokens(node.tokens)}"
+        return None
+
+    def setData(self, index, value, role=Qt.EditRole):
+        node = self.node(index)
+        if node is None or role != Qt.CheckStateRole or index.column() != SELECT_COLUMN:
+            return False
+        self.set_selected(node, value == Qt.Checked)
+        return True
+
+    def selected_tokens_of(self, node, state=None):
+        """Return the estimated tokens selected within a node whose totals are known."""
+        selected = self.selected_tokens.get(node)
+        if selected is not None:
+            return selected
+        if state is None:
+            state = self.selection.state_of(node.path)
+        return node.tokens if state[0] else 0
+
+    def set_selected(self, node, selected):
+        """Select or deselect a node's subtree and refresh the rows showing it."""
+        totals_known = self.snapshot.root.tokens is not None
+        if totals_known:
+            old = self.selected_tokens_of(node)
+        self.selection.set_selected(node.path, selected)
+        prefix = os.path.join(node.path, '')
+        for other in [other for other in self.selected_tokens if other.path.startswith(prefix)]:
+            del self.selected_tokens[other]
+        self.selected_tokens.pop(node, None)
+        if totals_known:
+            # Only the ancestors' counts change, by the same amount
+            delta = (node.tokens if selected else 0) - old
+            ancestor = node.parent
+            while ancestor is not None:
+                self.selected_tokens[ancestor] = self.selected_tokens_of(ancestor) + delta
+                ancestor = ancestor.parent
+        self.refresh(node)
+        if totals_known:
+            self.selected_tokens_changed.emit(self.selected_tokens_of(self.snapshot.root))
+
+    def refresh(self, node):
+        """Repaint a node, its ancestors and the loaded rows below it."""
+        self.dataChanged.emit(self.index_for(node), self.index_for(node, TOKENS_COLUMN))
+        ancestor = node.parent
+        while ancestor is not None:
+            index = self.index_for(ancestor, TOKENS_COLUMN)
+            self.dataChanged.emit(index, index)
+            ancestor = ancestor.parent
+        prefix = os.path.join(node.path, '')
+        for directory, rows in self.fetched.items():
+            if rows and (directory is node or directory.path.startswith(prefix)):
+                parent = self.index_for(directory)
+                self.dataChanged.emit(self.index(0, 0, parent), self.index(rows - 1, TOKENS_COLUMN, parent))
+
+    def totals_updated(self):
+        """Recount the selected tokens after compute_totals() and show the new totals."""
+        self.selected_tokens = {}
+        root = self.snapshot.root
+        if root.tokens is None:
+            return
+        self.count_selected(root, self.selection.state_of(root.path))
+        self.refresh(root)
+        self.selected_tokens_changed.emit(self.selected_tokens_of(root))
+
+    def count_selected(self, node, state):
+        """Count the selected tokens under a node, recording directories that are not uniform."""
+        counts = {}
+        stack = [(node, state, False)]
+        while stack:
+            current, current_state, children_done = stack.pop()
+            if children_done:
+                selected = sum(counts.pop(child) for child in current.children)
+                self.selected_tokens[current] = counts[current] = selected
+            elif not current.is_dir or not self.selection.has_marks_under(current.path, current_state[1]):
+                counts[current] = current.tokens if current_state[0] else 0
+            else:
+                stack.append((current, current_state, True))
+                stack.extend((child, self.selection.child_state(current_state, child.path), False)
+                             for child in current.children)
+        return counts[node]
+
+class DirectoryWatcher(QObject):
+    """Watch the directories shown in the tree for entries being added, removed or renamed.
+
+    QFileSystemWatcher (inotify on Linux) is used where it accepts the path.
+    Directories it refuses, for example past the inotify watch limit, are
+    polled for modification time changes instead. Changes are collected for
+    DEBOUNCE_MS so a burst of events leads to a single update.
+    """
+    DEBOUNCE_MS = 300
+    POLL_MS = 2000
+
+    directories_changed = pyqtSignal(list)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.watcher = QFileSystemWatcher(self)
+        self.watcher.directoryChanged.connect(self.on_changed)
+        self.polled = {}  # path -> modification time when last checked
+        self.changed = set()
+        self.debounce_timer = QTimer(self)
+        self.debounce_timer.setSingleShot(True)
+        self.debounce_timer.setInterval(self.DEBOUNCE_MS)
+        self.debounce_timer.timeout.connect(self.flush)
+        self.poll_timer = QTimer(self)
+        self.poll_timer.setInterval(self.POLL_MS)
+        self.poll_timer.timeout.connect(self.poll)
+
+    def watch(self, path):
+        if path in self.polled or self.watcher.addPath(path):
+            return
+        try:
+            self.polled[path] = os.stat(path).st_mtime_ns
+        except OSError:
+            return
+        if not self.poll_timer.isActive():
+            self.poll_timer.start()
+
+    def unwatch(self, path):
+        if self.polled.pop(path, None) is None:
+            self.watcher.removePath(path)
+
+    def clear(self):
+        """Stop watching everything."""
+        directories = self.watcher.directories()
+        if directories:
+            self.watcher.removePaths(directories)
+        self.polled.clear()
+        self.changed.clear()
+        self.poll_timer.stop()
+        self.debounce_timer.stop()
+
+    def on_changed(self, path):
+        self.changed.add(path)
+        self.debounce_timer.start()
+
+    def poll(self):
+        """Report polled directories whose modification time moved."""
+        for path, mtime_ns in list(self.polled.items()):
+            try:
+                current = os.stat(path).st_mtime_ns
+            except OSError:
+                current = None
+            if current != mtime_ns:
+                self.polled[path] = current
+                self.on_changed(path)
 
-def get_global_ignore_path():
-    """Return the full path for the global ignore JSON file."""
-    return os.path.join(CONFIG_DIR, GLOBAL_IGNORE_FILE)
+    def flush(self):
+        changed, self.changed = sorted(self.changed), set()
+        if changed:
+            self.directories_changed.emit(changed)
 
 class SettingsDialog(QDialog):
-    """Dialog for managing global ignore patterns."""
-    def __init__(self, global_ignores, parent=None):
+    """Dialog for managing global ignore patterns and general settings."""
+    def __init__(self, global_ignores, settings, parent=None):
         super().__init__(parent)
         self.setWindowTitle("Settings - Global Ignore")
         self.setGeometry(200, 200, 400, 300)
         self.global_ignores = global_ignores.copy()
+        self.settings = settings.copy()
         self.init_ui()
     
     def init_ui(self):
@@ -45,6 +583,72 @@ class SettingsDialog(QDialog):
         self.remove_button.clicked.connect(self.remove_ignore)
         buttons_layout.addWidget(self.remove_button)
         layout.addLayout(buttons_layout)
+
+        # Whether .gitignore files inside the selected directory are honoured
+        self.gitignore_checkbox = QCheckBox("Respect .gitignore files")
+        self.gitignore_checkbox.setChecked(self.settings['use_gitignore'])
+        layout.addWidget(self.gitignore_checkbox)
+
+        # Number of files read concurrently during export
+        workers_layout = QHBoxLayout()
+        workers_layout.addWidget(QLabel("Parallel file readers:"))
+        self.workers_spinbox = QSpinBox()
+        self.workers_spinbox.setRange(1, 64)
+        self.workers_spinbox.setValue(self.settings['read_workers'])
+        workers_layout.addWidget(self.workers_spinbox)
+        layout.addLayout(workers_layout)
+
+        # Reuse unchanged listings and file contents between scans
+        self.cache_checkbox = QCheckBox("Cache scans between exports")
+        self.cache_checkbox.setChecked(self.settings['scan_cache'])
+        layout.addWidget(self.cache_checkbox)
+
+        # How binary and large files are exported
+        self.binary_checkbox = QCheckBox("Skip binary files")
+        self.binary_checkbox.setChecked(self.settings['skip_binary'])
+        layout.addWidget(self.binary_checkbox)
+
+        limits_layout = QHBoxLayout()
+        limits_layout.addWidget(QLabel("Max file size:"))
+        self.max_file_spinbox = QSpinBox()
+        self.max_file_spinbox.setRange(0, 1024 * 1024)
+        self.max_file_spinbox.setSuffix(" KB")
+        self.max_file_spinbox.setSpecialValueText("No limit")
+        self.max_file_spinbox.setValue(self.settings['max_file_kb'])
+        limits_layout.addWidget(self.max_file_spinbox)
+        limits_layout.addWidget(QLabel("Max export size:"))
+        self.max_total_spinbox = QSpinBox()
+        self.max_total_spinbox.setRange(0, 1024 * 1024)
+        self.max_total_spinbox.setSuffix(" MB")
+        self.max_total_spinbox.setSpecialValueText("No limit")
+        self.max_total_spinbox.setValue(self.settings['max_total_mb'])
+        limits_layout.addWidget(self.max_total_spinbox)
+        layout.addLayout(limits_layout)
+
+        # Which directories are listed
+        self.symlinks_checkbox = QCheckBox("Follow symlinked folders")
+        self.symlinks_checkbox.setChecked(self.settings['follow_symlinks'])
+        layout.addWidget(self.symlinks_checkbox)
+
+        walk_layout = QHBoxLayout()
+        walk_layout.addWidget(QLabel("Max folder depth:"))
+        self.max_depth_spinbox = QSpinBox()
+        self.max_depth_spinbox.setRange(0, 10000)
+        self.max_depth_spinbox.setSpecialValueText("No limit")
+        self.max_depth_spinbox.setValue(self.settings['max_depth'])
+        walk_layout.addWidget(self.max_depth_spinbox)
+        walk_layout.addWidget(QLabel("Max entries:"))
+        self.max_entries_spinbox = QSpinBox()
+        self.max_entries_spinbox.setRange(0, 2**31 - 1)
+        self.max_entries_spinbox.setSpecialValueText("No limit")
+        self.max_entries_spinbox.setValue(self.settings['max_entries'])
+        walk_layout.addWidget(self.max_entries_spinbox)
+        layout.addLayout(walk_layout)
+
+        # Write repeated file contents once
+        self.dedupe_checkbox = QCheckBox("Write duplicate files as a reference to the first copy")
+        self.dedupe_checkbox.setChecked(self.settings['dedupe_files'])
+        layout.addWidget(self.dedupe_checkbox)
         
         # Dialog buttons to save or cancel changes
         self.dialog_buttons = QDialogButtonBox(QDialogButtonBox.Save | QDialogButtonBox.Cancel)
@@ -73,6 +677,21 @@ class SettingsDialog(QDialog):
         """Return the updated list of ignore patterns."""
         return [self.list_widget.item(i).text() for i in range(self.list_widget.count())]
 
+    def get_updated_settings(self):
+        """Return the updated settings dictionary."""
+        settings = self.settings.copy()
+        settings['use_gitignore'] = self.gitignore_checkbox.isChecked()
+        settings['read_workers'] = self.workers_spinbox.value()
+        settings['scan_cache'] = self.cache_checkbox.isChecked()
+        settings['skip_binary'] = self.binary_checkbox.isChecked()
+        settings['max_file_kb'] = self.max_file_spinbox.value()
+        settings['max_total_mb'] = self.max_total_spinbox.value()
+        settings['dedupe_files'] = self.dedupe_checkbox.isChecked()
+        settings['follow_symlinks'] = self.symlinks_checkbox.isChecked()
+        settings['max_depth'] = self.max_depth_spinbox.value()
+        settings['max_entries'] = self.max_entries_spinbox.value()
+        return settings
+
 class OutputDialog(QDialog):
     """Dialog to display the generated file tree."""
     def __init__(self, output_text, parent=None):
@@ -83,9 +702,10 @@ class OutputDialog(QDialog):
     
     def init_ui(self, text):
         layout = QVBoxLayout()
-        self.text_edit = QTextEdit()
+        self.text = text
+        self.text_edit = QPlainTextEdit()
         self.text_edit.setReadOnly(True)
-        self.text_edit.setText(text)
+        self.text_edit.setPlainText(text)
         layout.addWidget(self.text_edit)
         
         # Dialog buttons for copy, save, and close actions
@@ -103,7 +723,7 @@ class OutputDialog(QDialog):
     
     def copy_to_clipboard(self):
         """Copy text content to the clipboard."""
-        QApplication.clipboard().setText(self.text_edit.toPlainText())
+        QApplication.clipboard().setText(self.text)
         QMessageBox.information(self, "Copied", "Text copied to clipboard.")
     
     def save_file(self):
@@ -112,54 +732,140 @@ class OutputDialog(QDialog):
         if output_path:
             try:
                 with open(output_path, 'w', encoding='utf-8') as f:
-                    f.write(self.text_edit.toPlainText())
+                    f.write(self.text)
                 QMessageBox.information(self, "Success", f"File tree saved to {output_path}")
             except Exception as e:
                 QMessageBox.critical(self, "Error", f"Failed to save file tree:\n{e}")
 
 class ExportOutputDialog(QDialog):
-    """Dialog to display the exported file tree with file contents and a character count."""
-    def __init__(self, tree_text, file_contents, parent=None):
+    """Dialog to page through the exported file tree with file contents and a character count.
+
+    The export lives in a temporary file streamed by TreeWorker and is read
+    through its ExportIndex one page at a time, so the dialog holds a single
+    page of text however large the export is. Files can be jumped to by name;
+    saving copies the file on disk and it is deleted when the dialog closes.
+    """
+    def __init__(self, index, char_count, dropped_count=0, profile=None, parent=None):
         super().__init__(parent)
         self.setWindowTitle("Exported File Tree with Contents")
         self.setGeometry(150, 150, 800, 600)
-        self.init_ui(tree_text, file_contents)
+        self.index = index
+        self.file_offsets = [offset for _, offset in index.files]
+        self.page = None
+        self.init_ui(char_count, dropped_count, profile)
     
-    def init_ui(self, tree_text, file_contents):
+    def init_ui(self, char_count, dropped_count, profile):
         layout = QVBoxLayout()
-        self.text_edit = QTextEdit()
-        self.text_edit.setReadOnly(True)
 
-        # Build export text
-        export_text = "-----------------------------\n"
-        export_text += tree_text + "\n\n"
-        for rel_path, content in file_contents.items():
-            export_text += f"<{rel_path}>\n{content}\n</{rel_path}>\n\n"
-        export_text += "-----------------------------\n"
-        self.text_edit.setPlainText(export_text)
+        # Navigation: jump to a file, or step through the pages
+        nav_layout = QHBoxLayout()
+        self.file_combo = QComboBox()
+        self.file_combo.setEditable(True)
+        self.file_combo.setInsertPolicy(QComboBox.NoInsert)
+        # Avoid measuring every entry when the export holds many files
+        self.file_combo.setSizeAdjustPolicy(QComboBox.AdjustToMinimumContentsLengthWithIcon)
+        self.file_combo.setMinimumContentsLength(30)
+        self.file_combo.addItems([rel_path for rel_path, _ in self.index.files])
+        self.file_combo.completer().setFilterMode(Qt.MatchContains)
+        self.file_combo.completer().setCompletionMode(QCompleter.PopupCompletion)
+        self.file_combo.activated.connect(self.jump_to_file)
+        nav_layout.addWidget(QLabel("File:"))
+        nav_layout.addWidget(self.file_combo, 1)
+        self.prev_button = QPushButton("Previous")
+        self.prev_button.clicked.connect(lambda: self.show_page(self.page - 1))
+        nav_layout.addWidget(self.prev_button)
+        self.page_spinbox = QSpinBox()
+        self.page_spinbox.setRange(1, len(self.index.pages))
+        self.page_spinbox.setKeyboardTracking(False)
+        self.page_spinbox.setPrefix("Page ")
+        self.page_spinbox.setSuffix(f" of {len(self.index.pages)}")
+        self.page_spinbox.valueChanged.connect(lambda value: self.show_page(value - 1))
+        nav_layout.addWidget(self.page_spinbox)
+        self.next_button = QPushButton("Next")
+        self.next_button.clicked.connect(lambda: self.show_page(self.page + 1))
+        nav_layout.addWidget(self.next_button)
+        layout.addLayout(nav_layout)
+
+        self.text_edit = QPlainTextEdit()
+        self.text_edit.setReadOnly(True)
+        start = time.perf_counter()
+        self.show_page(0)
+        display_seconds = time.perf_counter() - start
         layout.addWidget(self.text_edit)
         
-        # Add a status bar with the character count
-        char_count = len(export_text)
-        self.status_label = QLabel(f"Character Count: {char_count}")
+        # Add a status bar with the character count and where the time went
+        status = f"Character Count: {char_count}"
+        if dropped_count:
+            status += f" | {dropped_count} files left out to fit the token budget"
+        if profile is not None:
+            status += f" | {profile.summary()}, display {display_seconds:.2f}s"
+        self.status_label = QLabel(status)
+        self.status_label.setWordWrap(True)
         self.status_label.setStyleSheet("padding: 4px; background-color: #f0f0f0; border: 1px solid #ccc;")
         layout.addWidget(self.status_label)
         
         buttons = QDialogButtonBox()
+        self.copy_file_button = buttons.addButton("Copy File", QDialogButtonBox.ActionRole)
         self.copy_button = buttons.addButton("Copy to Clipboard", QDialogButtonBox.ActionRole)
         self.save_button = buttons.addButton("Save", QDialogButtonBox.ActionRole)
         self.close_button = buttons.addButton("Close", QDialogButtonBox.RejectRole)
         layout.addWidget(buttons)
         
+        self.copy_file_button.setEnabled(bool(self.index.files))
+        self.copy_file_button.clicked.connect(self.copy_file_to_clipboard)
         self.copy_button.clicked.connect(self.copy_to_clipboard)
         self.save_button.clicked.connect(self.save_file)
         self.close_button.clicked.connect(self.close)
         
         self.setLayout(layout)
+
+    def show_page(self, page, offset=None):
+        """Display one page of the export, scrolled to a byte offset within it if given."""
+        page = max(0, min(page, len(self.index.pages) - 1))
+        start, end = self.index.page_range(page)
+        if page != self.page:
+            self.page = page
+            self.text_edit.setPlainText(self.index.text(start, end))
+        self.page_spinbox.blockSignals(True)
+        self.page_spinbox.setValue(page + 1)
+        self.page_spinbox.blockSignals(False)
+        self.prev_button.setEnabled(page > 0)
+        self.next_button.setEnabled(page + 1 < len(self.index.pages))
+        if offset is None:
+            offset = start
+        else:
+            # Put the requested line at the top of the view
+            block = self.text_edit.document().findBlock(len(self.index.text(start, offset)))
+            self.text_edit.setTextCursor(QTextCursor(block))
+            self.text_edit.verticalScrollBar().setValue(block.blockNumber())
+        # Show the file being viewed in the file box
+        file_number = bisect.bisect_right(self.file_offsets, offset) - 1
+        if file_number >= 0:
+            self.file_combo.setCurrentIndex(file_number)
+
+    def jump_to_file(self, file_number):
+        """Show the page holding the chosen file, with its opening tag at the top."""
+        offset = self.file_offsets[file_number]
+        self.show_page(self.index.page_of(offset), offset)
+
+    def copy_file_to_clipboard(self):
+        """Copy the block of the file chosen in the file box to the clipboard."""
+        file_number = self.file_combo.currentIndex()
+        if file_number < 0:
+            return
+        QApplication.clipboard().setText(self.index.text(*self.index.file_range(file_number)))
+        QMessageBox.information(self, "Copied", f"{self.index.files[file_number][0]} copied to clipboard.")
     
     def copy_to_clipboard(self):
-        """Copy the exported text to clipboard."""
-        QApplication.clipboard().setText(self.text_edit.toPlainText())
+        """Copy the exported text to clipboard, decoded once straight from the file on disk."""
+        if self.index.size > COPY_CONFIRM_BYTES:
+            answer = QMessageBox.question(
+                self, "Copy Export",
+                f"The export is {format_size(self.index.size)}; copying it holds all of it in memory. Copy anyway?"
+            )
+            if answer != QMessageBox.Yes:
+                return
+        QApplication.clipboard().setText(self.index.text())
         QMessageBox.information(self, "Copied", "Text copied to clipboard.")
     
     def save_file(self):
@@ -167,12 +873,20 @@ class ExportOutputDialog(QDialog):
         output_path, _ = QFileDialog.getSaveFileName(self, "Save Exported File Tree", "exported_file_tree.txt", "Text Files (*.txt)")
         if output_path:
             try:
-                with open(output_path, 'w', encoding='utf-8') as f:
-                    f.write(self.text_edit.toPlainText())
+                shutil.copyfile(self.index.path, output_path)
                 QMessageBox.information(self, "Success", f"Exported file tree saved to {output_path}")
             except Exception as e:
                 QMessageBox.critical(self, "Error", f"Failed to save exported file tree:\n{e}")
 
+    def done(self, result):
+        """Release and delete the temporary export file when the dialog closes."""
+        self.index.close()
+        try:
+            os.remove(self.index.path)
+        except OSError:
+            pass
+        super().done(result)
+
 class FileTreeApp(QWidget):
     """Main application window to display and export a file structure tree."""
     def __init__(self):
@@ -180,12 +894,25 @@ class FileTreeApp(QWidget):
         self.setWindowTitle("DirXtract")
         self.setGeometry(100, 100, 900, 600)
         
-        # Ensure CONFIG_DIR exists (for global ignore patterns only)
+        # Ensure CONFIG_DIR exists (for global ignore patterns and settings)
         if not os.path.exists(CONFIG_DIR):
             os.makedirs(CONFIG_DIR)
         
         self.current_directory = ""
+        self.snapshot = None
+        self.selection = None
+        self.model = None
+        self.estimator = None
+        self.worker = None
+        self.progress_dialog = None
+        # Directory changes reported while a worker walks the snapshot wait for it to finish
+        self.pending_changes = set()
+        self.watcher = DirectoryWatcher(self)
+        self.watcher.directories_changed.connect(self.on_directories_changed)
         self.global_ignores = self.load_global_ignores()
+        self.ignore_matcher = IgnoreMatcher(self.global_ignores)
+        self.settings = load_settings()
+        self.scan_cache = ScanCache.from_settings(self.settings)
         self.init_ui()
 
     def init_ui(self):
@@ -207,13 +934,34 @@ class FileTreeApp(QWidget):
         dir_layout.addWidget(self.settings_btn)
         layout.addLayout(dir_layout)
 
-        # Tree widget to show the file structure
-        self.tree = QTreeWidget()
-        self.tree.setHeaderLabels(["Select", "Name"])
-        self.tree.setColumnWidth(1, 700)
-        self.tree.itemExpanded.connect(self.on_item_expanded)
+        # Tree view to show the file structure; its model is created per directory
+        self.tree = QTreeView()
+        self.tree.setUniformRowHeights(True)
         layout.addWidget(self.tree)
 
+        # Token estimate and budget row
+        budget_layout = QHBoxLayout()
+        self.estimate_btn = QPushButton("Estimate Tokens")
+        self.estimate_btn.clicked.connect(self.estimate_tokens)
+        budget_layout.addWidget(self.estimate_btn)
+
+        self.tokens_label = QLabel("Selected: unknown")
+        budget_layout.addWidget(self.tokens_label)
+        budget_layout.addStretch()
+
+        budget_layout.addWidget(QLabel("Token budget:"))
+        self.budget_spinbox = QSpinBox()
+        self.budget_spinbox.setRange(0, 100000000)
+        self.budget_spinbox.setSingleStep(1000)
+        self.budget_spinbox.setSpecialValueText("No limit")
+        budget_layout.addWidget(self.budget_spinbox)
+
+        self.strategy_combo = QComboBox()
+        self.strategy_combo.addItem("Drop largest files first", BUDGET_STRATEGIES[0])
+        self.strategy_combo.addItem("Drop low-priority files first", BUDGET_STRATEGIES[1])
+        budget_layout.addWidget(self.strategy_combo)
+        layout.addLayout(budget_layout)
+
         # Action buttons: view tree, reset, export
         buttons_layout = QHBoxLayout()
         self.save_btn = QPushButton("View File Tree")
@@ -233,18 +981,11 @@ class FileTreeApp(QWidget):
 
     def load_global_ignores(self):
         """Load global ignore patterns from JSON file or use default values."""
-        ignore_path = get_global_ignore_path()
-        if os.path.exists(ignore_path):
-            try:
-                with open(ignore_path, 'r', encoding='utf-8') as f:
-                    ignores = json.load(f)
-                return ignores if isinstance(ignores, list) else []
-            except Exception:
-                return []
-        else:
-            default_ignores = ['.DS_Store', '.git', '__pycache__', '*.tmp']
-            self.save_global_ignores(default_ignores)
-            return default_ignores
+        ignores = load_global_ignores()
+        if ignores is None:
+            ignores = list(DEFAULT_GLOBAL_IGNORES)
+            self.save_global_ignores(ignores)
+        return ignores
 
     def save_global_ignores(self, ignores):
         """Save global ignore patterns to JSON file."""
@@ -255,12 +996,25 @@ class FileTreeApp(QWidget):
         except Exception as e:
             QMessageBox.critical(self, "Error", f"Failed to save global ignores:\n{e}")
 
+    def save_settings(self, settings):
+        """Save settings to JSON file."""
+        settings_path = get_settings_path()
+        try:
+            with open(settings_path, 'w', encoding='utf-8') as f:
+                json.dump(settings, f, indent=4)
+        except Exception as e:
+            QMessageBox.critical(self, "Error", f"Failed to save settings:\n{e}")
+
     def open_settings_dialog(self):
         """Open the settings dialog to update global ignore patterns."""
-        dialog = SettingsDialog(self.global_ignores, self)
+        dialog = SettingsDialog(self.global_ignores, self.settings, self)
         if dialog.exec_() == QDialog.Accepted:
             self.global_ignores = dialog.get_updated_ignores()
+            self.ignore_matcher = IgnoreMatcher(self.global_ignores)
             self.save_global_ignores(self.global_ignores)
+            self.settings = dialog.get_updated_settings()
+            self.scan_cache = ScanCache.from_settings(self.settings)
+            self.save_settings(self.settings)
             if self.current_directory:
                 self.load_directory(self.current_directory)
             QMessageBox.information(self, "Settings Saved", "Global ignore patterns have been updated.")
@@ -286,153 +1040,157 @@ class FileTreeApp(QWidget):
         All items are initially checked. The tree is built on the fly without
         persisting any selection state to disk.
         """
-        self.tree.blockSignals(True)
-        self.tree.clear()
         self.current_directory = path
-        
-        # Determine a display name for the root node
-        root_name = os.path.basename(path) if os.path.basename(path) else path
-        root_item = QTreeWidgetItem(self.tree, ["", root_name])
-        root_item.setData(0, Qt.UserRole, path)
-        root_item.setFlags(root_item.flags() | Qt.ItemIsUserCheckable)
-        root_item.setCheckState(0, Qt.Checked)
-        root_item.setChildIndicatorPolicy(QTreeWidgetItem.ShowIndicator)
-        
-        # Add immediate children for lazy loading
-        self.add_children(root_item, path)
-        self.tree.expandItem(root_item)
-        self.tree.blockSignals(False)
-        self.tree.itemChanged.connect(self.handle_item_changed)
-
-    def is_ignored(self, name):
-        """Check if a file/directory name matches any global ignore pattern."""
-        return any(fnmatch.fnmatch(name, pattern) for pattern in self.global_ignores)
-
-    def add_children(self, parent_item, parent_path):
-        """Add child items (files and directories) to a given tree item."""
-        try:
-            for item_name in sorted(os.listdir(parent_path), key=lambda s: s.lower()):
-                if self.is_ignored(item_name):
-                    continue
-                item_path = os.path.join(parent_path, item_name)
-                child_item = QTreeWidgetItem(parent_item, ["", item_name])
-                child_item.setData(0, Qt.UserRole, item_path)
-                child_item.setFlags(child_item.flags() | Qt.ItemIsUserCheckable)
-                child_item.setCheckState(0, Qt.Checked)
-                if os.path.isdir(item_path):
-                    child_item.setChildIndicatorPolicy(QTreeWidgetItem.ShowIndicator)
-                    # Add a dummy child for lazy expansion
-                    child_item.addChild(QTreeWidgetItem(child_item, ["", "Loading..."]))
-        except PermissionError:
-            pass  # Skip directories without permission
-        except Exception as e:
-            print(f"Error accessing {parent_path}: {e}")
-
-    def on_item_expanded(self, item):
-        """When an item is expanded, remove dummy child and load its real children."""
-        if item.childCount() == 1 and item.child(0).text(1) == "Loading...":
-            item.removeChild(item.child(0))
-            self.add_children(item, item.data(0, Qt.UserRole))
-
-    def handle_item_changed(self, item, column):
-        """Propagate checkbox state changes to all descendant items."""
-        if column == 0:
-            self.tree.blockSignals(True)
-            self.propagate_check_state(item, item.checkState(0))
-            self.tree.blockSignals(False)
-
-    def propagate_check_state(self, item, state):
-        """Recursively set the check state for all children of an item."""
-        for i in range(item.childCount()):
-            child = item.child(i)
-            child.setCheckState(0, state)
-            self.propagate_check_state(child, state)
-
-    def collect_deselected(self, item):
-        """
-        Recursively collect the names of unchecked items.
-        Returns a dictionary mapping parent directory paths to a list of deselected names.
-        """
-        deselected = {}
-        path = item.data(0, Qt.UserRole)
-        if not path or not isinstance(path, str):
-            return deselected
-        parent_path = os.path.dirname(path)
-        if item.checkState(0) == Qt.Unchecked:
-            deselected.setdefault(parent_path, []).append(os.path.basename(path))
-        for i in range(item.childCount()):
-            child = item.child(i)
-            for k, v in self.collect_deselected(child).items():
-                deselected.setdefault(k, []).extend(v)
-        return deselected
-
-    def traverse_and_format(self, path, prefix, is_last, lines, deselected):
-        """
-        Recursively traverse the filesystem to build a formatted tree structure.
-        Excludes files/folders matching global ignore patterns and unchecked items.
-        """
-        name = os.path.basename(path) + "/" if os.path.isdir(path) else os.path.basename(path)
-        lines.append(f"{prefix}{'└── ' if is_last else '├── '}{name}")
-        new_prefix = prefix + ("    " if is_last else "│   ")
-        if os.path.isdir(path):
-            try:
-                items = sorted(os.listdir(path), key=lambda s: s.lower())
-            except PermissionError:
-                return
-            # Filter items based on ignore patterns and current deselections
-            items = [item for item in items if not self.is_ignored(item)]
-            if path in deselected:
-                items = [item for item in items if item not in deselected[path]]
-            for i, item in enumerate(items):
-                self.traverse_and_format(os.path.join(path, item), new_prefix, i == len(items) - 1, lines, deselected)
-
-    def traverse_for_export(self, path, prefix="", is_last=True, relative_path="", deselected=None):
-        """
-        Recursively traverse to generate tree structure and collect file paths (for export).
-        Returns a tuple of (formatted lines, dict mapping relative paths to full file paths).
-        """
-        if deselected is None:
-            deselected = {}
-        lines = []
-        display_name = os.path.basename(path) + "/" if os.path.isdir(path) else os.path.basename(path)
-        lines.append(f"{prefix}{'└── ' if is_last else '├── '}{display_name}")
-        files_dict = {}
-        if not os.path.isdir(path):
-            files_dict[relative_path.replace(os.sep, "/")] = path
-            return lines, files_dict
-
-        new_prefix = prefix + ("    " if is_last else "│   ")
-        try:
-            items = sorted(os.listdir(path), key=lambda s: s.lower())
-        except PermissionError:
-            return lines, files_dict
-        items = [item for item in items if not self.is_ignored(item)]
-        if path in deselected:
-            items = [item for item in items if item not in deselected[path]]
-        for i, item in enumerate(items):
-            item_path = os.path.join(path, item)
-            child_is_last = (i == len(items) - 1)
-            new_rel = os.path.join(relative_path, item) if relative_path else item
-            child_lines, child_files = self.traverse_for_export(item_path, new_prefix, child_is_last, new_rel, deselected)
-            lines.extend(child_lines)
-            files_dict.update(child_files)
-        return lines, files_dict
+        self.selection = SelectionModel()
+        root_cache = self.scan_cache.open(path) if self.scan_cache is not None else None
+        self.snapshot = DirectorySnapshot(path, self.ignore_matcher, self.settings['use_gitignore'], root_cache,
+                                          WalkLimits.from_settings(self.settings))
+        self.estimator = TokenEstimator()
+        self.tokens_label.setText("Selected: unknown")
 
-    def save_file_tree(self):
-        """Generate and display the file tree based on current selections."""
+        self.watcher.clear()
+        self.pending_changes.clear()
+        old_model = self.model
+        self.model = SnapshotTreeModel(self.snapshot, self.selection, self)
+        self.model.selected_tokens_changed.connect(self.show_selected_tokens)
+        self.model.directory_shown.connect(self.watcher.watch)
+        self.model.directory_hidden.connect(self.watcher.unwatch)
+        self.tree.setModel(self.model)
+        self.tree.setColumnWidth(NAME_COLUMN, 500)
+        if old_model is not None:
+            old_model.wait_for_listings()
+            old_model.deleteLater()
+        # Expanding the root lists it in the background
+        self.tree.expand(self.model.index(0, 0))
+
+    def closeEvent(self, event):
+        """Stop a running TreeWorker and let background listings finish before the window goes away."""
+        if self.worker is not None:
+            self.worker.requestInterruption()
+            self.worker.wait()
+        if self.model is not None:
+            self.model.wait_for_listings()
+        super().closeEvent(event)
+
+    def on_directories_changed(self, paths):
+        """Update the tree for directories that changed on disk."""
+        if self.worker is not None:
+            self.pending_changes.update(paths)
+            return
+        totals_known = self.snapshot.root.tokens is not None
+        # Parents first, so directories removed along with their parent are skipped
+        for path in sorted(paths, key=len):
+            node = self.model.shown.get(path)
+            if node is None:
+                continue
+            self.model.rescan(node)
+            for child in node.children or ():
+                if not child.is_dir:
+                    self.estimator.forget(child.path)
+            self.snapshot.forget_totals(node)
+        if totals_known:
+            self.model.totals_invalidated()
+            self.tokens_label.setText("Selected: unknown")
+
+    def show_selected_tokens(self, tokens):
+        """Show the estimated tokens in the current selection."""
+        self.tokens_label.setText(f"Selected: ~{format_tokens(tokens)} tokens")
+
+    def start_worker(self, mode):
+        """Walk the current selection on a TreeWorker behind a modal progress dialog."""
+        # The progress dialog only blocks input once it shows, so a quick second click lands here
+        if self.worker is not None:
+            return
         if not self.current_directory or not os.path.isdir(self.current_directory):
             QMessageBox.warning(self, "Invalid Directory", "Please select a valid directory first.")
             return
 
-        deselected = self.collect_deselected(self.tree.topLevelItem(0))
-        lines = []
-        self.traverse_and_format(self.current_directory, prefix="", is_last=True, lines=lines, deselected=deselected)
-        if not lines:
+        self.worker = TreeWorker(
+            self.snapshot, os.path.basename(self.current_directory), self.selection.copy(), mode,
+            self.settings['read_workers'], self.estimator,
+            token_budget=self.budget_spinbox.value(),
+            budget_strategy=self.strategy_combo.currentData(),
+            low_priority=IgnoreMatcher(self.settings['low_priority_patterns']),
+            limits=ReadLimits.from_settings(self.settings),
+            dedupe=self.settings['dedupe_files'],
+            parent=self
+        )
+        titles = {MODE_TREE: "Building File Tree", MODE_EXPORT: "Exporting", MODE_TOTALS: "Estimating Tokens"}
+        # The dialog is window modal so the tree cannot be expanded while the worker walks it
+        self.progress_dialog = QProgressDialog("Scanning directories...", "Cancel", 0, 0, self)
+        self.progress_dialog.setWindowTitle(titles[mode])
+        self.progress_dialog.setWindowModality(Qt.WindowModal)
+        self.progress_dialog.setMinimumDuration(500)
+        self.progress_dialog.setAutoClose(False)
+        self.progress_dialog.setAutoReset(False)
+        self.progress_dialog.canceled.connect(self.worker.requestInterruption)
+
+        self.worker.progress.connect(self.update_progress)
+        self.worker.total_files.connect(self.progress_dialog.setMaximum)
+        self.worker.tree_ready.connect(self.show_tree_result)
+        self.worker.export_ready.connect(self.show_export_result)
+        self.worker.totals_ready.connect(self.show_totals_result)
+        self.worker.failed.connect(self.show_worker_error)
+        self.worker.finished.connect(self.worker_finished)
+        self.worker.start()
+
+    def update_progress(self, files_done, bytes_read, path):
+        """Show worker progress in the progress dialog."""
+        if self.progress_dialog is None:
+            return
+        if files_done:
+            self.progress_dialog.setValue(files_done)
+            self.progress_dialog.setLabelText(
+                f"Read {files_done} files ({bytes_read / (1024 * 1024):.1f} MB)\n{path}"
+            )
+        else:
+            self.progress_dialog.setLabelText(f"Scanning directories...\n{path}")
+
+    def close_progress_dialog(self):
+        """Close the progress dialog, if one is showing."""
+        if self.progress_dialog is not None:
+            self.progress_dialog.close()
+            self.progress_dialog = None
+
+    def worker_finished(self):
+        """Close the progress dialog and release the worker thread once it has stopped."""
+        self.close_progress_dialog()
+        if self.worker is not None:
+            self.worker.deleteLater()
+            self.worker = None
+        if self.pending_changes:
+            paths, self.pending_changes = list(self.pending_changes), set()
+            self.on_directories_changed(paths)
+
+    def show_tree_result(self, tree_text):
+        """Display the finished file tree."""
+        self.close_progress_dialog()
+        if not tree_text:
             QMessageBox.information(self, "No Selection", "No files or directories selected.")
             return
-        dialog = OutputDialog("\n".join(lines), self)
+        dialog = OutputDialog(tree_text, self)
+        dialog.exec_()
+
+    def show_export_result(self, index, char_count, dropped_count, profile):
+        """Display the finished export."""
+        self.close_progress_dialog()
+        dialog = ExportOutputDialog(index, char_count, dropped_count, profile, self)
         dialog.exec_()
 
+    def show_totals_result(self):
+        """Show the freshly computed size and token totals in the tree."""
+        self.close_progress_dialog()
+        self.model.totals_updated()
+
+    def show_worker_error(self, message):
+        """Report an unexpected error raised by the worker."""
+        self.close_progress_dialog()
+        QMessageBox.critical(self, "Error", f"Failed to process directory:\n{message}")
+
+    def save_file_tree(self):
+        """Generate and display the file tree based on current selections."""
+        self.start_worker(MODE_TREE)
+
     def reset_tree(self):
         """Reload the current directory to reset any temporary selection changes."""
         if not self.current_directory:
@@ -443,37 +1201,11 @@ class FileTreeApp(QWidget):
 
     def export_file_contents(self):
         """Export the file tree along with contents of selected files."""
-        if not self.current_directory or not os.path.isdir(self.current_directory):
-            QMessageBox.warning(self, "Invalid Directory", "Please select a valid directory first.")
-            return
-
-        deselected = self.collect_deselected(self.tree.topLevelItem(0))
-        lines, files_dict = self.traverse_for_export(
-            self.current_directory, prefix="", is_last=True,
-            relative_path=os.path.basename(self.current_directory), deselected=deselected
-        )
-        if not lines:
-            QMessageBox.information(self, "No Selection", "No files or directories selected.")
-            return
+        self.start_worker(MODE_EXPORT)
 
-        # Read file contents for each selected file
-        file_contents = {}
-        for rel_path, full_path in files_dict.items():
-            try:
-                with open(full_path, 'r', encoding='utf-8') as f:
-                    content = f.read()
-            except UnicodeDecodeError:
-                try:
-                    with open(full_path, 'r', encoding='latin1') as f:
-                        content = f.read()
-                except Exception as e:
-                    content = f"Could not read file: {e}"
-            except Exception as e:
-                content = f"Could not read file: {e}"
-            file_contents[rel_path] = content
-
-        dialog = ExportOutputDialog("\n".join(lines), file_contents, self)
-        dialog.exec_()
+    def estimate_tokens(self):
+        """Compute size and token totals for the whole tree in the background."""
+        self.start_worker(MODE_TOTALS)
 
 def main():
     """Entry point of the application."""
@@ -0,0 +1,72 @@
+"""Micro-benchmark: compiled IgnoreMatcher vs. the per-pattern fnmatch loop.
+
+Run from the repository root:
+
+    python benchmarks/bench_ignore.py [--patterns 150] [--names 20000]
+"""
+import argparse
+import fnmatch
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from dirxtract_core import IgnoreMatcher  # noqa: E402
+
+LITERALS = ['.git', '__pycache__', '.DS_Store', 'node_modules', '.venv', 'dist', 'build', '.idea', '.tox']
+EXTENSIONS = ['py', 'js', 'ts', 'md', 'json', 'txt', 'c', 'h', 'go', 'rs', 'tmp', 'log', 'o', 'pyc', 'so']
+
+def make_patterns(count, rng):
+    """Build a realistic mix of literal names and glob patterns."""
+    patterns = list(LITERALS)
+    while len(patterns) < count:
+        if rng.random() < 0.5:
+            patterns.append(f"*.{rng.choice(EXTENSIONS)}{rng.randint(0, 99)}")
+        else:
+            patterns.append(f"generated_{rng.randint(0, 9999)}")
+    return patterns[:count]
+
+def make_names(count, rng):
+    """Build entry names, a few of which hit the literal ignores."""
+    names = []
+    for i in range(count):
+        if rng.random() < 0.05:
+            names.append(rng.choice(LITERALS))
+        else:
+            names.append(f"file_{i}.{rng.choice(EXTENSIONS)}")
+    return names
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--patterns', type=int, default=150)
+    parser.add_argument('--names', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    patterns = make_patterns(args.patterns, rng)
+    names = make_names(args.names, rng)
+    matcher = IgnoreMatcher(patterns)
+
+    def fnmatch_loop():
+        return [any(fnmatch.fnmatch(name, pattern) for pattern in patterns) for name in names]
+
+    def compiled():
+        return [matcher.is_ignored(name) for name in names]
+
+    if fnmatch_loop() != compiled():
+        sys.exit("Results differ between the fnmatch loop and IgnoreMatcher")
+
+    build = min(timeit.repeat(lambda: IgnoreMatcher(patterns), number=1, repeat=args.repeat))
+    loop = min(timeit.repeat(fnmatch_loop, number=1, repeat=args.repeat))
+    fast = min(timeit.repeat(compiled, number=1, repeat=args.repeat))
+    print(f"{args.patterns} patterns, {args.names} names")
+    print(f"  matcher build : {build * 1000:8.2f} ms")
+    print(f"  fnmatch loop  : {loop * 1000:8.2f} ms  ({loop / args.names * 1e6:.2f} us/name)")
+    print(f"  IgnoreMatcher : {fast * 1000:8.2f} ms  ({fast / args.names * 1e6:.2f} us/name)")
+    print(f"  speedup       : {loop / fast:8.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Benchmark: exporting large text files read into str vs. streamed from memory maps.
+
+Builds a corpus of large text files (UTF-8, UTF-8 with CRLF line endings and
+latin1) in a temporary directory, then exports it once per read path, each in
+its own process so peak RSS is measured separately. Run from the repository
+root (Unix only, for the resource module):
+
+    python benchmarks/bench_read.py [--files 4] [--mb 32] [--workers 8]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from dirxtract_core import IgnoreMatcher, ReadLimits, export_directory  # noqa: E402
+from synthetic_tree import peak_rss_mb  # noqa: E402
+
+# Read path name -> ReadLimits passed to export_directory (None reads every file into a str).
+# The per-file limit is off so the large files are streamed whole rather than truncated
+MODES = {
+    'read': None,
+    'stream': ReadLimits(skip_binary=False, max_file_bytes=0),
+}
+
+LINE = "    result = compute_value(alpha, beta)  # naïve café résumé\n"
+
+def make_corpus(directory, files, mb):
+    """Write files of roughly mb MB each, cycling through the three encodings."""
+    kinds = [('utf8.py', 'utf-8', '\n'), ('crlf.py', 'utf-8', '\r\n'), ('latin1.py', 'latin1', '\n')]
+    for i in range(files):
+        suffix, encoding, newline = kinds[i % len(kinds)]
+        line = LINE.replace('\n', newline).encode(encoding)
+        block = line * (1024 * 1024 // len(line) + 1)
+        with open(os.path.join(directory, f"file_{i}_{suffix}"), 'wb') as f:
+            for _ in range(mb):
+                f.write(block)
+
+def run_child(mode, directory, workers):
+    """Export the corpus with one read path and print the timings as JSON."""
+    with tempfile.TemporaryFile('w', encoding='utf-8', newline='') as out:
+        start = time.perf_counter()
+        chars = export_directory(directory, out, IgnoreMatcher([]), read_workers=workers, limits=MODES[mode])
+        out.flush()
+        seconds = time.perf_counter() - start
+    print(json.dumps({'seconds': seconds, 'chars': chars, 'peak_rss_mb': peak_rss_mb()}))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--files', type=int, default=4)
+    parser.add_argument('--mb', type=int, default=32, help="approximate size of each file in MB")
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--child', nargs=2, metavar=('MODE', 'DIR'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child[0], args.child[1], args.workers)
+        return
+
+    with tempfile.TemporaryDirectory(prefix="dirxtract_bench_") as directory:
+        make_corpus(directory, args.files, args.mb)
+        total_mb = sum(entry.stat().st_size for entry in os.scandir(directory)) / (1024 * 1024)
+        print(f"{args.files} files, {total_mb:.0f} MB, {args.workers} workers")
+        results = {}
+        for mode in MODES:
+            output = subprocess.run(
+                [sys.executable, __file__, '--workers', str(args.workers), '--child', mode, directory],
+                check=True, capture_output=True, text=True
+            ).stdout
+            results[mode] = json.loads(output)
+        if len({result['chars'] for result in results.values()}) != 1:
+            sys.exit("Read paths exported different amounts of text")
+        for mode, result in results.items():
+            print(f"  {mode:<7}: {result['seconds']:6.2f} s  {total_mb / result['seconds']:7.1f} MB/s"
+                  f"  peak RSS {result['peak_rss_mb']:7.1f} MB")
+
+if __name__ == "__main__":
+    main()
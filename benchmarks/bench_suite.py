@@ -0,0 +1,210 @@
+"""Benchmark suite for the walk and export hot paths on a synthetic tree.
+
+Generates a tree with benchmarks/synthetic_tree.py, then times each phase in
+its own process so peak memory is measured separately:
+
+    tree       snapshot listing plus file tree text (format_tree)
+    export     full export with the default read limits
+    ignore     IgnoreMatcher.match over every entry name in the tree
+    selection  marking a share of the tree deselected and walking it with the selection
+
+For every phase it reports the best wall time over --repeat runs, filesystem
+calls made through Python (scandir, stat, lstat, open), read and write syscalls
+from /proc/self/io where the platform has it, and peak RSS. Results are
+saved as JSON; pass a previous file with --compare to see the change.
+Run from the repository root (Unix only, for the resource module):
+
+    python benchmarks/bench_suite.py [--depth 4] [--fanout 4] [--files 20] [-o results.json]
+        [--compare previous.json] [--tree-dir DIR]
+"""
+import argparse
+import builtins
+import contextlib
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from dirxtract_core import (  # noqa: E402
+    DEFAULT_GLOBAL_IGNORES, DEFAULT_SETTINGS, DirectorySnapshot, IgnoreMatcher, ReadLimits,
+    SelectionModel, export_directory
+)
+from synthetic_tree import (  # noqa: E402
+    IGNORE_PATTERNS, add_shape_arguments, generate_tree, peak_rss_mb, shape_from_args
+)
+
+PHASES = ('tree', 'export', 'ignore', 'selection')
+
+# Share of directories and files deselected, and of those re-included, in the selection phase
+DESELECT_RATIO = 0.2
+REINCLUDE_RATIO = 0.1
+
+def make_matcher():
+    return IgnoreMatcher(DEFAULT_GLOBAL_IGNORES + IGNORE_PATTERNS)
+
+@contextlib.contextmanager
+def count_fs_calls(counts):
+    """Count calls to os.scandir, os.stat, os.lstat and open made while the block runs."""
+    originals = {'scandir': os.scandir, 'stat': os.stat, 'lstat': os.lstat, 'open': builtins.open}
+
+    def counting(name, function):
+        def wrapper(*args, **kwargs):
+            counts[name] += 1
+            return function(*args, **kwargs)
+        return wrapper
+
+    for name in originals:
+        counts[name] = 0
+    os.scandir = counting('scandir', originals['scandir'])
+    os.stat = counting('stat', originals['stat'])
+    os.lstat = counting('lstat', originals['lstat'])
+    builtins.open = counting('open', originals['open'])
+    try:
+        yield counts
+    finally:
+        os.scandir = originals['scandir']
+        os.stat = originals['stat']
+        os.lstat = originals['lstat']
+        builtins.open = originals['open']
+
+def read_proc_io():
+    """Return (read syscalls, write syscalls) from /proc/self/io, or None where unavailable."""
+    try:
+        with open('/proc/self/io', 'r') as f:
+            fields = dict(line.split(': ') for line in f.read().splitlines())
+        return int(fields['syscr']), int(fields['syscw'])
+    except (OSError, KeyError, ValueError):
+        return None
+
+def walk_entries(snapshot):
+    """List the whole snapshot; returns (name, path relative to the root, is_dir) for every entry."""
+    entries = []
+    base_len = len(os.path.join(snapshot.root.path, ''))
+    stack = [snapshot.root]
+    while stack:
+        node = stack.pop()
+        for child in snapshot.list_children(node):
+            entries.append((child.name, child.path[base_len:], child.is_dir))
+            if child.is_dir:
+                stack.append(child)
+    return entries
+
+def prepare(phase, tree_dir):
+    """Build what a phase needs outside the timed region; returns a callable running the phase once."""
+    name = os.path.basename(tree_dir)
+    if phase == 'tree':
+        return lambda: DirectorySnapshot(tree_dir, make_matcher()).format_tree(name)
+    if phase == 'export':
+        limits = ReadLimits.from_settings(DEFAULT_SETTINGS)
+
+        def export():
+            with tempfile.TemporaryFile('w', encoding='utf-8', newline='') as out:
+                export_directory(tree_dir, out, make_matcher(), limits=limits)
+        return export
+    if phase == 'ignore':
+        # Match the unfiltered tree, so ignore hits are part of the work
+        entries = walk_entries(DirectorySnapshot(tree_dir, IgnoreMatcher([])))
+        matcher = make_matcher()
+        return lambda: [matcher.match(*entry) for entry in entries]
+    if phase == 'selection':
+        snapshot = DirectorySnapshot(tree_dir, make_matcher())
+        paths = [os.path.join(tree_dir, rel_path) for _, rel_path, _ in walk_entries(snapshot)]
+        rng = random.Random(0)
+        deselected = rng.sample(paths, int(len(paths) * DESELECT_RATIO))
+        reincluded = rng.sample(deselected, int(len(deselected) * REINCLUDE_RATIO))
+
+        def select():
+            selection = SelectionModel()
+            for path in deselected:
+                selection.set_selected(path, False)
+            for path in reincluded:
+                selection.set_selected(path, True)
+            return snapshot.format_tree(name, selection)
+        return select
+    raise ValueError(f"Unknown phase: {phase}")
+
+def run_child(phase, tree_dir, repeat):
+    """Run one phase repeat times and print its measurements as JSON."""
+    run = prepare(phase, tree_dir)
+    best = None
+    counts = {}
+    for _ in range(repeat):
+        io_before = read_proc_io()
+        with count_fs_calls(counts):
+            start = time.perf_counter()
+            run()
+            seconds = time.perf_counter() - start
+        io_after = read_proc_io()
+        best = seconds if best is None else min(best, seconds)
+    result = {'wall_s': best, 'fs_calls': dict(counts), 'peak_rss_mb': peak_rss_mb()}
+    if io_before is not None and io_after is not None:
+        result['read_syscalls'] = io_after[0] - io_before[0]
+        result['write_syscalls'] = io_after[1] - io_before[1]
+    print(json.dumps(result))
+
+def print_results(results, previous=None):
+    for phase, result in results['phases'].items():
+        calls = sum(result['fs_calls'].values())
+        line = (f"  {phase:<9}: {result['wall_s'] * 1000:9.1f} ms  {calls:8d} fs calls"
+                f"  peak RSS {result['peak_rss_mb']:7.1f} MB")
+        if 'read_syscalls' in result:
+            line += f"  {result['read_syscalls']:7d} reads {result['write_syscalls']:7d} writes"
+        old = (previous or {}).get('phases', {}).get(phase)
+        if old:
+            line += f"  ({result['wall_s'] / old['wall_s']:.2f}x previous time)"
+        print(line)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    add_shape_arguments(parser)
+    parser.add_argument('--phases', nargs='+', choices=PHASES, default=list(PHASES))
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--tree-dir', help="generate the tree here and keep it (default: a temporary directory)")
+    parser.add_argument('-o', '--output', default='bench_results.json', help="JSON file to write the results to")
+    parser.add_argument('--compare', metavar='JSON', help="earlier results to compare wall times with")
+    parser.add_argument('--child', nargs=2, metavar=('PHASE', 'DIR'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child[0], args.child[1], args.repeat)
+        return
+
+    previous = None
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            previous = json.load(f)
+
+    with contextlib.ExitStack() as stack:
+        tree_dir = args.tree_dir or stack.enter_context(tempfile.TemporaryDirectory(prefix="dirxtract_bench_"))
+        tree_dir = os.path.join(os.path.abspath(tree_dir), 'tree')
+        shape = shape_from_args(args)
+        stats = generate_tree(tree_dir, **shape)
+        print(f"{stats['dirs']} dirs, {stats['files']} files, {stats['bytes'] / (1024 * 1024):.1f} MB")
+        results = {
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'shape': shape,
+            'tree': stats,
+            'phases': {},
+        }
+        for phase in args.phases:
+            output = subprocess.run(
+                [sys.executable, __file__, '--repeat', str(args.repeat), '--child', phase, tree_dir],
+                check=True, capture_output=True, text=True
+            ).stdout
+            results['phases'][phase] = json.loads(output)
+
+    print_results(results, previous)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results saved to {args.output}")
+
+if __name__ == "__main__":
+    main()
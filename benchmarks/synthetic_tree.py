@@ -0,0 +1,116 @@
+"""Generate a synthetic directory tree with a controllable shape for the benchmarks.
+
+Run from the repository root to create a tree on disk:
+
+    python benchmarks/synthetic_tree.py DIR [--depth 4] [--fanout 4] [--files 20]
+        [--size-kb 4] [--size-sigma 1.0] [--binary-ratio 0.05] [--ignore-ratio 0.1]
+
+File sizes follow a log-normal distribution with the given median. Entries
+that hit IGNORE_PATTERNS make up about ignore-ratio of each directory.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+
+# Patterns the ignore-hit entries are named to match, on top of the default global ignores
+IGNORE_PATTERNS = ['*.tmp', '*.log', 'cache_*/']
+
+TEXT_LINE = b"def function_%d(value):  # synthetic source line\n"
+EXTENSIONS = ['py', 'js', 'md', 'json', 'txt', 'c', 'go']
+BINARY_EXTENSIONS = ['png', 'so', 'bin', 'zip']
+
+def make_blocks(rng, size=1024 * 1024):
+    """Build one block of text and one of binary data that file contents are sliced from."""
+    text = bytearray()
+    line = 0
+    while len(text) < size:
+        text += TEXT_LINE % line
+        line += 1
+    binary = b'\x00' + bytes(rng.getrandbits(8) for _ in range(4096)) * (size // 4096)
+    return bytes(text[:size]), binary[:size]
+
+def write_file(path, size, block):
+    with open(path, 'wb') as f:
+        while size > 0:
+            chunk = block[:min(size, len(block))]
+            f.write(chunk)
+            size -= len(chunk)
+
+def generate_tree(root, depth=4, fanout=4, files=20, size_kb=4.0, size_sigma=1.0,
+                  binary_ratio=0.05, ignore_ratio=0.1, seed=0):
+    """
+    Create a tree under root; every directory above depth has fanout subdirectories
+    and each directory holds files files. Returns counts of what was written.
+    """
+    rng = random.Random(seed)
+    text_block, binary_block = make_blocks(rng)
+    stats = {'dirs': 0, 'files': 0, 'bytes': 0, 'binary_files': 0, 'ignored_entries': 0}
+
+    def fill(directory, level):
+        os.makedirs(directory, exist_ok=True)
+        stats['dirs'] += 1
+        for i in range(files):
+            if rng.random() < ignore_ratio:
+                name = f"file_{i}.{rng.choice(['tmp', 'log'])}"
+                stats['ignored_entries'] += 1
+                binary = False
+            elif rng.random() < binary_ratio:
+                name = f"file_{i}.{rng.choice(BINARY_EXTENSIONS)}"
+                stats['binary_files'] += 1
+                binary = True
+            else:
+                name = f"file_{i}.{rng.choice(EXTENSIONS)}"
+                binary = False
+            size = int(rng.lognormvariate(0, size_sigma) * size_kb * 1024)
+            write_file(os.path.join(directory, name), size, binary_block if binary else text_block)
+            stats['files'] += 1
+            stats['bytes'] += size
+        if level < depth:
+            for i in range(fanout):
+                if rng.random() < ignore_ratio:
+                    stats['ignored_entries'] += 1
+                    name = f"cache_{i}"
+                else:
+                    name = f"dir_{i}"
+                fill(os.path.join(directory, name), level + 1)
+
+    fill(root, 1)
+    return stats
+
+def add_shape_arguments(parser):
+    """Add the tree shape options shared with the benchmark harness."""
+    parser.add_argument('--depth', type=int, default=4)
+    parser.add_argument('--fanout', type=int, default=4, help="subdirectories per directory")
+    parser.add_argument('--files', type=int, default=20, help="files per directory")
+    parser.add_argument('--size-kb', type=float, default=4.0, help="median file size in KB")
+    parser.add_argument('--size-sigma', type=float, default=1.0, help="spread of the log-normal file sizes")
+    parser.add_argument('--binary-ratio', type=float, default=0.05)
+    parser.add_argument('--ignore-ratio', type=float, default=0.1)
+    parser.add_argument('--seed', type=int, default=0)
+
+def shape_from_args(args):
+    return {
+        'depth': args.depth, 'fanout': args.fanout, 'files': args.files, 'size_kb': args.size_kb,
+        'size_sigma': args.size_sigma, 'binary_ratio': args.binary_ratio,
+        'ignore_ratio': args.ignore_ratio, 'seed': args.seed,
+    }
+
+def peak_rss_mb():
+    """Return the peak resident memory of this process in MB; shared by the benchmark scripts."""
+    # Imported here so generating a tree also works where the module is missing (Windows)
+    import resource
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Reported in bytes on macOS and in kilobytes elsewhere
+    return rss / (1024 * 1024) if sys.platform == 'darwin' else rss / 1024
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('root', help="directory to create the tree in")
+    add_shape_arguments(parser)
+    args = parser.parse_args()
+    print(json.dumps(generate_tree(args.root, **shape_from_args(args)), indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,233 @@
+"""Batch export of many root directories on a process pool.
+
+A manifest lists the roots to export, each with its own ignore patterns and
+exclusions. Every root is exported by a separate worker process, which
+compiles its ignore patterns, walks the tree and reads the files (on its own
+reader threads), so roots are spread across cores. Each root gets its own
+output file, and summary.json in the output directory records the files,
+sizes and phase timings of every root.
+
+The manifest is a JSON object; relative paths in it are relative to the
+manifest file:
+
+    {
+        "output_dir": "exports",
+        "defaults": {"ignore": ["*.lock"], "dedupe": true},
+        "roots": [
+            "services/billing",
+            {"path": "services/auth", "exclude": ["docs/build"], "output": "auth.txt"}
+        ]
+    }
+
+Options for a root, or for all roots in "defaults": ignore (patterns added to
+the global ones), exclude (paths relative to the root), global_ignores,
+gitignore, token_budget, budget_strategy, dedupe, skip_binary, max_file_kb,
+max_total_mb, read_workers, follow_symlinks, max_depth and max_entries.
+Settings not given come from config/settings.json. The scan cache is not
+used, since worker processes would race on its shared index of roots.
+"""
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from dirxtract_core import (
+    BUDGET_STRATEGIES, DEFAULT_GLOBAL_IGNORES, ExportProfile, IgnoreMatcher, ReadLimits, WalkLimits,
+    load_global_ignores, load_settings, prepare_export, selection_from_excludes, write_export
+)
+
+SUMMARY_FILE = 'summary.json'
+
+# Options a root may set, with their defaults when neither the root nor the manifest's defaults do
+ROOT_OPTIONS = {
+    'ignore': [],
+    'exclude': [],
+    'global_ignores': True,
+    'gitignore': True,
+    'token_budget': 0,
+    'budget_strategy': BUDGET_STRATEGIES[0],
+    'dedupe': None,
+    'skip_binary': None,
+    'max_file_kb': None,
+    'max_total_mb': None,
+    'read_workers': None,
+    'follow_symlinks': None,
+    'max_depth': None,
+    'max_entries': None,
+}
+# Options holding a list of strings, a true/false flag or a whole number; other options are strings
+LIST_OPTIONS = ('ignore', 'exclude')
+FLAG_OPTIONS = ('global_ignores', 'gitignore', 'dedupe', 'skip_binary', 'follow_symlinks')
+NUMBER_OPTIONS = ('token_budget', 'max_file_kb', 'max_total_mb', 'read_workers', 'max_depth', 'max_entries')
+
+class ManifestError(Exception):
+    """Raised when a batch manifest cannot be read or is malformed."""
+
+def check_options(options, where):
+    """Raise ManifestError if an option in the dictionary has the wrong type; None keeps a default."""
+    for name, value in options.items():
+        if name in LIST_OPTIONS:
+            valid = isinstance(value, list) and all(isinstance(item, str) for item in value)
+            expected = "a list of strings"
+        elif value is None and ROOT_OPTIONS.get(name, '') is None:
+            continue
+        elif name in FLAG_OPTIONS:
+            valid, expected = isinstance(value, bool), "true or false"
+        elif name in NUMBER_OPTIONS:
+            # bool is a subclass of int, but true is not a number of tokens
+            minimum = 1 if name == 'read_workers' else 0
+            valid = isinstance(value, int) and not isinstance(value, bool) and value >= minimum
+            expected = f"a whole number of at least {minimum}"
+        else:
+            valid, expected = isinstance(value, str), "a string"
+        if not valid:
+            raise ManifestError(f"{name} for {where} must be {expected}: {value!r}")
+
+def load_manifest(path, output_dir=None):
+    """
+    Read a manifest and resolve it into one job dictionary per root, ready to be sent
+    to export_root() in a worker process. output_dir, if given, overrides the manifest's;
+    like the manifest's own, a relative one is taken relative to the manifest.
+    Returns (output directory, list of jobs).
+    """
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError) as e:
+        raise ManifestError(f"cannot read manifest {path}: {e}")
+    if isinstance(manifest, list):
+        manifest = {'roots': manifest}
+    if not isinstance(manifest, dict) or not isinstance(manifest.get('roots'), list):
+        raise ManifestError("the manifest needs a list of roots")
+    if not isinstance(manifest.get('output_dir', ''), str):
+        raise ManifestError(f"output_dir must be a string: {manifest['output_dir']!r}")
+    base = os.path.dirname(os.path.abspath(path))
+    output_dir = os.path.join(base, output_dir or manifest.get('output_dir', 'exports'))
+    defaults = manifest.get('defaults', {})
+    if not isinstance(defaults, dict):
+        raise ManifestError("the manifest's defaults must be an object")
+    unknown = set(defaults) - set(ROOT_OPTIONS)
+    if unknown:
+        raise ManifestError(f"unknown default options: {', '.join(sorted(unknown))}")
+    check_options(defaults, "defaults")
+
+    settings = load_settings()
+    global_ignores = load_global_ignores()
+    if global_ignores is None:
+        global_ignores = DEFAULT_GLOBAL_IGNORES
+    entries = [{'path': entry} if isinstance(entry, str) else entry for entry in manifest['roots']]
+    for entry in entries:
+        if not isinstance(entry, dict) or not isinstance(entry.get('path'), str):
+            raise ManifestError(f"a root needs a path: {entry!r}")
+        if not isinstance(entry.get('output', ''), str):
+            raise ManifestError(f"output for {entry['path']} must be a string: {entry['output']!r}")
+    # Outputs named in the manifest are kept; other roots are named around them
+    outputs = set()
+    for entry in entries:
+        if entry.get('output'):
+            output = os.path.normcase(entry['output'])
+            if output in outputs:
+                raise ManifestError(f"two roots have the same output: {entry['output']}")
+            outputs.add(output)
+    jobs = []
+    for entry in entries:
+        unknown = set(entry) - set(ROOT_OPTIONS) - {'path', 'output'}
+        if unknown:
+            raise ManifestError(f"unknown options for {entry['path']}: {', '.join(sorted(unknown))}")
+        check_options({name: value for name, value in entry.items() if name in ROOT_OPTIONS}, entry['path'])
+        options = dict(ROOT_OPTIONS, **defaults)
+        options.update((name, value) for name, value in entry.items() if name in ROOT_OPTIONS)
+        if options['budget_strategy'] not in BUDGET_STRATEGIES:
+            raise ManifestError(f"unknown budget strategy for {entry['path']}: {options['budget_strategy']}")
+        root = os.path.normpath(os.path.join(base, entry['path']))
+        output = entry.get('output')
+        if not output:
+            # Named after the root, numbered when two roots share a name
+            stem = os.path.basename(root)
+            output = stem + '.txt'
+            number = 1
+            while os.path.normcase(output) in outputs:
+                number += 1
+                output = f"{stem}-{number}.txt"
+            outputs.add(os.path.normcase(output))
+
+        root_settings = dict(settings)
+        for name in ('skip_binary', 'max_file_kb', 'max_total_mb', 'read_workers', 'follow_symlinks',
+                     'max_depth', 'max_entries'):
+            if options[name] is not None:
+                root_settings[name] = options[name]
+        if options['dedupe'] is not None:
+            root_settings['dedupe_files'] = options['dedupe']
+        jobs.append({
+            'path': root,
+            'output': os.path.join(output_dir, output),
+            'patterns': (list(global_ignores) if options['global_ignores'] else []) + list(options['ignore']),
+            'exclude': list(options['exclude']),
+            'use_gitignore': settings['use_gitignore'] and options['gitignore'],
+            'token_budget': options['token_budget'],
+            'budget_strategy': options['budget_strategy'],
+            'settings': root_settings,
+        })
+    return output_dir, jobs
+
+def export_root(job):
+    """
+    Export one root described by a job from load_manifest(); runs in a worker process.
+    Returns a summary dictionary for the root; failures are reported in its 'error' key.
+    """
+    start = time.perf_counter()
+    profile = ExportProfile()
+    settings = job['settings']
+    summary = {'path': job['path'], 'output': job['output']}
+    try:
+        if not os.path.isdir(job['path']):
+            raise NotADirectoryError(f"not a directory: {job['path']}")
+        lines, files_dict, contents = prepare_export(
+            job['path'], IgnoreMatcher(job['patterns']), job['use_gitignore'], settings['read_workers'],
+            selection_from_excludes(job['path'], job['exclude']), None, job['token_budget'],
+            job['budget_strategy'], IgnoreMatcher(settings['low_priority_patterns']),
+            ReadLimits.from_settings(settings), profile, settings['dedupe_files'],
+            walk_limits=WalkLimits.from_settings(settings)
+        )
+        with open(job['output'], 'w', encoding='utf-8', newline='') as out:
+            summary['chars'] = write_export(out, "\n".join(lines), contents, profile)
+        summary['files'] = len(files_dict)
+        summary['bytes'] = os.path.getsize(job['output'])
+    except Exception as e:
+        summary['error'] = str(e)
+    summary['seconds'] = round(time.perf_counter() - start, 4)
+    summary['phases'] = {phase: round(profile.seconds[phase], 4)
+                         for phase in ExportProfile.PHASES if profile.counts[phase]}
+    return summary
+
+def run_batch(output_dir, jobs, processes=None, progress=None):
+    """
+    Export every job on a pool of worker processes and write summary.json to output_dir.
+    progress, if given, is called with each root's summary as it finishes.
+    Returns the summary dictionary written, with roots in manifest order.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    for job in jobs:
+        os.makedirs(os.path.dirname(job['output']), exist_ok=True)
+    start = time.perf_counter()
+    results = [None] * len(jobs)
+    if jobs:
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            futures = {pool.submit(export_root, job): number for number, job in enumerate(jobs)}
+            for future in as_completed(futures):
+                results[futures[future]] = summary = future.result()
+                if progress is not None:
+                    progress(summary)
+    summary = {
+        'roots': results,
+        'total': {
+            'roots': len(results),
+            'failed': sum(1 for result in results if 'error' in result),
+            'files': sum(result.get('files', 0) for result in results),
+            'bytes': sum(result.get('bytes', 0) for result in results),
+            'seconds': round(time.perf_counter() - start, 4),
+        },
+    }
+    with open(os.path.join(output_dir, SUMMARY_FILE), 'w', encoding='utf-8') as f:
+        json.dump(summary, f, indent=2)
+    return summary
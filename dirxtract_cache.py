@@ -0,0 +1,258 @@
+"""Persistent scan cache for DirXtract.
+
+Listings and decoded file contents are stored under config/scan_cache so a
+re-export only re-lists directories whose mtime changed and only re-reads
+files whose size or mtime changed. Each root gets its own directory holding
+an index.json and a blobs/ folder of contents named by their SHA-1 hash.
+roots.json tracks when every root was last used and how much space it takes,
+so the least recently used roots are evicted once the cache grows past its
+limits. A root that alone outgrows the size limit drops its least recently
+used file contents instead.
+"""
+import hashlib
+import json
+import os
+import shutil
+import stat
+import threading
+import time
+
+from dirxtract_core import (
+    CONFIG_DIR, DEFAULT_SETTINGS, SNIFF_BYTES, SPECIAL_FILE_TEXT, decode_text, looks_binary, read_file_text,
+    read_limited, scan_dir
+)
+
+CACHE_DIR_NAME = 'scan_cache'
+CACHE_VERSION = 3
+
+# Entries modified this recently are not cached; a change within the same
+# mtime tick would otherwise go unnoticed on the next scan
+RACY_WINDOW_NS = 2 * 10**9
+
+def get_cache_dir():
+    """Return the directory holding the scan cache, next to the global ignore file."""
+    return os.path.join(CONFIG_DIR, CACHE_DIR_NAME)
+
+def _read_json(path, default):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
+
+def _write_json(path, data):
+    """Write JSON atomically so an interrupted save never leaves a truncated file."""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, separators=(',', ':'))
+    os.replace(tmp_path, path)
+
+class RootCache:
+    """Cached listings and file contents for one root directory.
+
+    list_dir() and read_file_text() are drop-in replacements for
+    dirxtract_core.scan_dir() and read_file_text(); they may be called from
+    several reader threads at once.
+    """
+    def __init__(self, scan_cache, root_path, key):
+        self.scan_cache = scan_cache
+        self.root_path = root_path
+        self.key = key
+        self.directory = os.path.join(scan_cache.cache_dir, key)
+        self.blob_dir = os.path.join(self.directory, 'blobs')
+        index = _read_json(os.path.join(self.directory, 'index.json'), {})
+        if index.get('version') != CACHE_VERSION or index.get('root') != root_path:
+            index = {}
+        # path -> [mtime_ns, [[name, is_dir], ...]]
+        self.dirs = index.get('dirs', {})
+        # path -> [size, mtime_ns, content hash, 1 if the file looks binary]
+        self.files = index.get('files', {})
+        self.lock = threading.Lock()
+
+    def blob_path(self, digest):
+        return os.path.join(self.blob_dir, digest)
+
+    def list_dir(self, path):
+        """List a directory, reusing the cached listing while its mtime is unchanged."""
+        mtime_ns = os.stat(path).st_mtime_ns
+        cached = self.dirs.get(path)
+        if cached is not None and cached[0] == mtime_ns:
+            return [(name, bool(is_dir)) for name, is_dir in cached[1]]
+        listing = scan_dir(path)
+        if mtime_ns < time.time_ns() - RACY_WINDOW_NS:
+            self.dirs[path] = [mtime_ns, [[name, int(is_dir)] for name, is_dir in listing]]
+        else:
+            self.dirs.pop(path, None)
+        return listing
+
+    def read_file_text(self, full_path, limits=None, profile=None):
+        """Read a file like dirxtract_core.read_file_text, using the cached text while its stat is unchanged."""
+        try:
+            start = time.perf_counter()
+            st = os.stat(full_path)
+            if not stat.S_ISREG(st.st_mode):
+                return SPECIAL_FILE_TEXT, 0
+            if limits is not None and limits.is_oversized(st.st_size):
+                # Truncated reads are cheap already and their text depends on the limits
+                return read_file_text(full_path, limits, profile)
+            cached = self.files.get(full_path)
+            if cached is not None and cached[3] and limits is not None and limits.skip_binary:
+                cached = None  # Cached while binary files were exported; read again for the placeholder
+            if cached is not None and cached[0] == st.st_size and cached[1] == st.st_mtime_ns:
+                try:
+                    with open(self.blob_path(cached[2]), 'r', encoding='utf-8', newline='') as f:
+                        text = f.read()
+                    with self.lock:
+                        # Moved to the end so the entries stay ordered from least to most recently used
+                        if self.files.pop(full_path, None) is not None:
+                            self.files[full_path] = cached
+                    if profile is not None:
+                        profile.add_file(full_path, time.perf_counter() - start, 0, st.st_size)
+                    return text, st.st_size
+                except OSError:
+                    pass  # Blob evicted or damaged; fall back to the file itself
+            with open(full_path, 'rb') as f:
+                binary = looks_binary(f.read(SNIFF_BYTES))
+                f.seek(0)
+                if limits is not None:
+                    text, bytes_read, complete = read_limited(f, st.st_size, limits, profile)
+                else:
+                    data = f.read()
+                    read_end = time.perf_counter()
+                    text, bytes_read, complete = decode_text(data), len(data), True
+                    if profile is not None:
+                        profile.add_file(full_path, read_end - start, time.perf_counter() - read_end, bytes_read)
+        except Exception as e:
+            return f"Could not read file: {e}", 0
+        # Only complete text files are cached; binary placeholders are cheap to rebuild
+        if complete and st.st_mtime_ns < time.time_ns() - RACY_WINDOW_NS:
+            self.store_blob(full_path, st, text, binary)
+        else:
+            self.files.pop(full_path, None)
+        return text, bytes_read
+
+    def store_blob(self, full_path, st, text, binary=False):
+        """Record a file's decoded text under its content hash."""
+        encoded = text.encode('utf-8')
+        digest = hashlib.sha1(encoded).hexdigest()
+        blob_path = self.blob_path(digest)
+        try:
+            if not os.path.exists(blob_path):
+                with self.lock:
+                    os.makedirs(self.blob_dir, exist_ok=True)
+                tmp_path = f"{blob_path}.{threading.get_ident()}.tmp"
+                with open(tmp_path, 'wb') as f:
+                    f.write(encoded)
+                os.replace(tmp_path, blob_path)
+        except OSError:
+            return
+        with self.lock:
+            self.files.pop(full_path, None)
+            self.files[full_path] = [st.st_size, st.st_mtime_ns, digest, int(binary)]
+
+    def forget(self, path):
+        """Drop cached listings and contents for a path and everything below it."""
+        prefix = os.path.join(path, '')
+        with self.lock:
+            for entries in (self.dirs, self.files):
+                for key in [key for key in entries if key == path or key.startswith(prefix)]:
+                    del entries[key]
+
+    def prune(self):
+        """Drop entries for paths that no longer appear in their parent's cached listing."""
+        # Keys are matched against os.path.split() parents, which never end in a separator
+        listed = {path.rstrip(os.sep) or path: {name for name, _ in entry[1]}
+                  for path, entry in self.dirs.items()}
+
+        def reachable(path):
+            parent, name = os.path.split(path)
+            return path == self.root_path or name in listed.get(parent, ())
+
+        self.dirs = {path: entry for path, entry in self.dirs.items() if reachable(path)}
+        self.files = {path: entry for path, entry in self.files.items() if reachable(path)}
+
+    def collect_blobs(self, max_bytes=None):
+        """
+        Delete blobs no longer referenced by any file entry; returns the bytes kept. With max_bytes,
+        the least recently used file entries are dropped first until their blobs fit in it.
+        """
+        sizes = {}
+        try:
+            with os.scandir(self.blob_dir) as entries:
+                for entry in entries:
+                    try:
+                        sizes[entry.name] = entry.stat().st_size
+                    except OSError:
+                        pass
+        except OSError:
+            pass
+        kept = 0
+        referenced = set()
+        files = []
+        # Most recently used first; entries whose blob is missing are dropped too
+        for path, entry in reversed(list(self.files.items())):
+            digest = entry[2]
+            if digest not in referenced:
+                if digest not in sizes or (max_bytes is not None and kept + sizes[digest] > max_bytes):
+                    break
+                referenced.add(digest)
+                kept += sizes[digest]
+            files.append((path, entry))
+        self.files = dict(reversed(files))
+        for name in sizes.keys() - referenced:
+            try:
+                os.remove(self.blob_path(name))
+            except OSError:
+                pass
+        return kept
+
+    def save(self):
+        """Write the index to disk and let the scan cache enforce its limits."""
+        self.prune()
+        os.makedirs(self.directory, exist_ok=True)
+        # Trimmed here because the scan cache never evicts the root being saved
+        size = self.collect_blobs(self.scan_cache.max_bytes)
+        _write_json(os.path.join(self.directory, 'index.json'), {
+            'version': CACHE_VERSION,
+            'root': self.root_path,
+            'dirs': self.dirs,
+            'files': self.files,
+        })
+        self.scan_cache.touch(self.key, self.root_path, size)
+
+class ScanCache:
+    """All cached roots, with LRU eviction across roots by count and total size."""
+    def __init__(self, cache_dir=None, max_mb=DEFAULT_SETTINGS['scan_cache_max_mb'],
+                 max_roots=DEFAULT_SETTINGS['scan_cache_max_roots']):
+        self.cache_dir = cache_dir or get_cache_dir()
+        self.max_bytes = max_mb * 1024 * 1024
+        self.max_roots = max_roots
+        self.manifest_path = os.path.join(self.cache_dir, 'roots.json')
+
+    @classmethod
+    def from_settings(cls, settings):
+        """Build a ScanCache from the settings dictionary, or return None when caching is off."""
+        if not settings['scan_cache']:
+            return None
+        return cls(max_mb=settings['scan_cache_max_mb'], max_roots=settings['scan_cache_max_roots'])
+
+    def open(self, root_path):
+        """Return the RootCache for a directory, loading any previous scan of it."""
+        absolute = os.path.abspath(root_path)
+        key = hashlib.sha1(absolute.encode('utf-8', 'surrogateescape')).hexdigest()[:16]
+        return RootCache(self, root_path, key)
+
+    def touch(self, key, root_path, size):
+        """Mark a root as most recently used and evict the least recently used roots over the limits."""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        manifest = _read_json(self.manifest_path, {})
+        manifest[key] = {'root': root_path, 'last_used': time.time(), 'bytes': size}
+        total = 0
+        for index, (other_key, entry) in enumerate(
+                sorted(manifest.items(), key=lambda item: item[1]['last_used'], reverse=True)):
+            total += entry['bytes']
+            if other_key != key and (index >= self.max_roots or total > self.max_bytes):
+                shutil.rmtree(os.path.join(self.cache_dir, other_key), ignore_errors=True)
+                total -= entry['bytes']
+                del manifest[other_key]
+        _write_json(self.manifest_path, manifest)
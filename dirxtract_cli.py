@@ -0,0 +1,197 @@
+"""Command line interface for DirXtract.
+
+Runs without PyQt5 and writes the same output as the GUI:
+
+    python dirxtract_cli.py tree PATH [--ignore PATTERN ...] [--exclude REL_PATH ...] [-o FILE]
+    python dirxtract_cli.py export PATH [--ignore PATTERN ...] [--exclude REL_PATH ...] [-o FILE]
+    python dirxtract_cli.py export PATH --split-chars N -o FILE   (FILE.part01, FILE.part02, ...)
+    python dirxtract_cli.py batch MANIFEST [-o DIR] [--processes N]   (see dirxtract_batch.py)
+"""
+import argparse
+import os
+import sys
+
+from dirxtract_cache import ScanCache
+from dirxtract_core import (
+    BUDGET_STRATEGIES, DEFAULT_GLOBAL_IGNORES, PROFILE_ENV, DirectorySnapshot, ExportProfile,
+    IgnoreMatcher, ReadLimits, WalkLimits, export_directory, export_directory_split, load_global_ignores,
+    load_settings, selection_from_excludes
+)
+
+def build_parser():
+    """Build the argument parser for the tree and export commands."""
+    parser = argparse.ArgumentParser(
+        prog="dirxtract", description="Export a directory tree and file contents as text."
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    for name, help_text in (("tree", "print the file tree only"),
+                            ("export", "print the file tree followed by file contents")):
+        sub = subparsers.add_parser(name, help=help_text)
+        sub.add_argument("path", help="directory to process")
+        sub.add_argument("--ignore", action="append", default=[], metavar="PATTERN",
+                         help="extra ignore pattern (gitignore syntax), may be repeated")
+        sub.add_argument("--exclude", action="append", default=[], metavar="REL_PATH",
+                         help="path relative to PATH to leave out, like unchecking it in the GUI")
+        sub.add_argument("--no-global-ignores", action="store_true",
+                         help="do not apply the patterns from config/global_ignore.json")
+        sub.add_argument("--no-gitignore", action="store_true",
+                         help="do not apply .gitignore files found inside PATH")
+        sub.add_argument("--follow-symlinks", action=argparse.BooleanOptionalAction, default=None,
+                         help="list symlinked directories; each directory is still listed once "
+                              "(default: the 'follow_symlinks' setting)")
+        sub.add_argument("--max-depth", type=int, metavar="N",
+                         help="do not list directories more than N levels below PATH, 0 for no limit "
+                              "(default: the 'max_depth' setting)")
+        sub.add_argument("--max-entries", type=int, metavar="N",
+                         help="stop listing after N entries, 0 for no limit "
+                              "(default: the 'max_entries' setting)")
+        sub.add_argument("--workers", type=int, metavar="N",
+                         help="number of files read concurrently (export only)")
+        sub.add_argument("--cache", action=argparse.BooleanOptionalAction, default=None,
+                         help="reuse unchanged listings and contents from config/scan_cache "
+                              "(default: the 'scan_cache' setting)")
+        if name == "export":
+            sub.add_argument("--token-budget", type=int, default=0, metavar="TOKENS",
+                             help="leave out files until the estimated export fits in TOKENS")
+            sub.add_argument("--budget-strategy", choices=BUDGET_STRATEGIES, default=BUDGET_STRATEGIES[0],
+                             help="drop the largest files first, or files matching the "
+                                  "'low_priority_patterns' setting first (default: largest)")
+            sub.add_argument("--include-binary", action="store_true",
+                             help="export binary files as text instead of a one-line placeholder")
+            sub.add_argument("--max-file-kb", type=int, metavar="KB",
+                             help="keep only the head and tail of larger files, 0 for no limit "
+                                  "(default: the 'max_file_kb' setting)")
+            sub.add_argument("--max-total-mb", type=int, metavar="MB",
+                             help="leave out the remaining files once the export reaches MB, 0 for "
+                                  "no limit (default: the 'max_total_mb' setting)")
+            sub.add_argument("--dedupe", action=argparse.BooleanOptionalAction, default=None,
+                             help="write repeated file contents once and a reference for later copies "
+                                  "(default: the 'dedupe_files' setting)")
+            split = sub.add_mutually_exclusive_group()
+            split.add_argument("--split-chars", type=int, default=0, metavar="N",
+                               help="write numbered parts of at most about N characters next to "
+                                    "--output instead of one export")
+            split.add_argument("--split-tokens", type=int, default=0, metavar="TOKENS",
+                               help="like --split-chars, with parts of at most about TOKENS tokens")
+        sub.add_argument("--profile", metavar="JSON",
+                         help="write per-phase and per-directory timings to JSON "
+                              f"(default: the {PROFILE_ENV} environment variable, if set)")
+        sub.add_argument("-o", "--output", metavar="FILE", help="write to FILE instead of stdout")
+    batch = subparsers.add_parser("batch", help="export every root listed in a JSON manifest")
+    batch.add_argument("manifest", help="JSON manifest of roots and their options")
+    batch.add_argument("-o", "--output-dir", metavar="DIR",
+                       help="directory for the exports and summary.json (default: the manifest's "
+                            "output_dir, or 'exports' next to it)")
+    batch.add_argument("--processes", type=int, metavar="N",
+                       help="roots exported at the same time (default: one per CPU)")
+    return parser
+
+def main_batch(args):
+    """Run the batch command: export every root in the manifest and print a summary."""
+    # Imported here so the tree and export commands do not load multiprocessing
+    from dirxtract_batch import ManifestError, load_manifest, run_batch
+    # A directory given on the command line is relative to the working directory, not the manifest
+    output_dir = os.path.abspath(args.output_dir) if args.output_dir else None
+    try:
+        output_dir, jobs = load_manifest(args.manifest, output_dir)
+    except ManifestError as e:
+        print(f"dirxtract: {e}", file=sys.stderr)
+        return 2
+
+    def progress(result):
+        if 'error' in result:
+            print(f"{result['path']}: failed: {result['error']}", file=sys.stderr)
+        else:
+            print(f"{result['path']}: {result['files']} files, {result['bytes']} bytes "
+                  f"in {result['seconds']:.2f}s -> {result['output']}", file=sys.stderr)
+
+    summary = run_batch(output_dir, jobs, args.processes, progress)
+    total = summary['total']
+    print(f"{total['roots']} roots, {total['files']} files, {total['bytes']} bytes in "
+          f"{total['seconds']:.2f}s; summary in {output_dir}", file=sys.stderr)
+    return 1 if total['failed'] else 0
+
+def open_output(path):
+    """Open the output file, or stdout, as UTF-8 with '\\n' line endings like the GUI export."""
+    if path:
+        return open(path, 'w', encoding='utf-8', newline='')
+    return open(sys.stdout.fileno(), 'w', encoding='utf-8', newline='', closefd=False)
+
+def main(argv=None):
+    """Entry point of the command line interface."""
+    args = build_parser().parse_args(argv)
+    if args.command == "batch":
+        return main_batch(args)
+    if not os.path.isdir(args.path):
+        print(f"dirxtract: not a directory: {args.path}", file=sys.stderr)
+        return 2
+
+    root = os.path.abspath(args.path)
+    settings = load_settings()
+    patterns = []
+    if not args.no_global_ignores:
+        ignores = load_global_ignores()
+        patterns.extend(DEFAULT_GLOBAL_IGNORES if ignores is None else ignores)
+    patterns.extend(args.ignore)
+    matcher = IgnoreMatcher(patterns)
+    use_gitignore = settings['use_gitignore'] and not args.no_gitignore
+    read_workers = args.workers if args.workers is not None else settings['read_workers']
+    selection = selection_from_excludes(root, args.exclude)
+    if args.cache is not None:
+        settings['scan_cache'] = args.cache
+    if args.follow_symlinks is not None:
+        settings['follow_symlinks'] = args.follow_symlinks
+    if args.max_depth is not None:
+        settings['max_depth'] = args.max_depth
+    if args.max_entries is not None:
+        settings['max_entries'] = args.max_entries
+    walk_limits = WalkLimits.from_settings(settings)
+    if args.command == "export":
+        if args.include_binary:
+            settings['skip_binary'] = False
+        if args.max_file_kb is not None:
+            settings['max_file_kb'] = args.max_file_kb
+        if args.max_total_mb is not None:
+            settings['max_total_mb'] = args.max_total_mb
+        if args.dedupe is not None:
+            settings['dedupe_files'] = args.dedupe
+        if (args.split_chars or args.split_tokens) and not args.output:
+            print("dirxtract: --split-chars and --split-tokens need --output", file=sys.stderr)
+            return 2
+    scan_cache = ScanCache.from_settings(settings)
+    root_cache = scan_cache.open(root) if scan_cache is not None else None
+    profile_path = args.profile or os.environ.get(PROFILE_ENV)
+    profile = ExportProfile() if profile_path else None
+
+    if args.command == "export" and (args.split_chars or args.split_tokens):
+        parts = export_directory_split(
+            root, args.output, matcher, args.split_chars, args.split_tokens,
+            use_gitignore=use_gitignore, read_workers=read_workers, selection=selection,
+            cache=root_cache, token_budget=args.token_budget, budget_strategy=args.budget_strategy,
+            low_priority=IgnoreMatcher(settings['low_priority_patterns']),
+            limits=ReadLimits.from_settings(settings), profile=profile, dedupe=settings['dedupe_files'],
+            walk_limits=walk_limits
+        )
+        for part, char_count in parts:
+            print(f"{part}: {char_count} characters", file=sys.stderr)
+    else:
+        with open_output(args.output) as out:
+            if args.command == "tree":
+                snapshot = DirectorySnapshot(root, matcher, use_gitignore, root_cache, walk_limits)
+                snapshot.profile = profile
+                lines, _ = snapshot.format_tree(os.path.basename(root), selection)
+                out.write("\n".join(lines) + "\n")
+            else:
+                export_directory(
+                    root, out, matcher, use_gitignore, read_workers, selection, root_cache,
+                    args.token_budget, args.budget_strategy, IgnoreMatcher(settings['low_priority_patterns']),
+                    ReadLimits.from_settings(settings), profile, settings['dedupe_files'], walk_limits
+                )
+    if root_cache is not None:
+        root_cache.save()
+    if profile is not None:
+        profile.save(profile_path, root)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,1562 @@
+"""Qt-free core of DirXtract: ignore matching, directory snapshots and export formatting.
+
+Both the GUI (Dirxtract.py) and the command line (dirxtract_cli.py) build on
+this module, so their output is identical.
+"""
+import os
+import bisect
+import codecs
+import functools
+import hashlib
+import json
+import math
+import mmap
+import queue
+import re
+import stat
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+# Directory to store configuration for global ignore patterns and settings
+CONFIG_DIR = 'config'
+GLOBAL_IGNORE_FILE = 'global_ignore.json'
+SETTINGS_FILE = 'settings.json'
+
+# Ignore patterns written when the global ignore file does not exist yet
+DEFAULT_GLOBAL_IGNORES = ['.DS_Store', '.git', '__pycache__', '*.tmp']
+
+# Settings used when the settings file is missing or incomplete
+DEFAULT_SETTINGS = {
+    'use_gitignore': True,
+    'read_workers': 8,
+    'scan_cache': False,
+    'scan_cache_max_mb': 512,
+    'scan_cache_max_roots': 20,
+    # Binary files are replaced by a one-line placeholder instead of being read
+    'skip_binary': True,
+    # Text files larger than this keep only their head and tail (0 means no limit)
+    'max_file_kb': 1024,
+    # Files after the export reaches this size are left out (0 means no limit)
+    'max_total_mb': 0,
+    # Files matching these patterns (gitignore syntax) are dropped first by a priority budget
+    'low_priority_patterns': ['*.lock', '*.min.js', '*.map', '*.svg', '*.csv', 'test/', 'tests/', 'docs/'],
+    # Files whose content was already exported are written as a reference to the first copy
+    'dedupe_files': False,
+    # Whether symlinked directories are listed; each directory is listed once either way
+    'follow_symlinks': False,
+    # Directories deeper than this below the root are not listed (0 means no limit)
+    'max_depth': 0,
+    # Listing stops once this many entries have been found (0 means no limit)
+    'max_entries': 0,
+}
+
+# Ways to choose which files to drop when an export has to fit a token budget
+BUDGET_STRATEGIES = ('largest', 'priority')
+
+# Line written above and below an export
+EXPORT_SEPARATOR = "-----------------------------\n"
+
+# Files shorter than this are always written out, even when their content was seen before
+DEDUPE_MIN_CHARS = 256
+
+# Part files of a split export written at the same time
+SPLIT_WRITERS = 4
+# (rel_path, text, size) items queued for each part writer
+SPLIT_QUEUE_ITEMS = 64
+
+# Bytes of an export file shown at a time by a paged viewer
+VIEW_PAGE_BYTES = 512 * 1024
+
+# Bytes read from the start of a file to decide whether it is binary
+SNIFF_BYTES = 8192
+
+# Environment variable naming a JSON file to write an ExportProfile to after each export
+PROFILE_ENV = 'DIRXTRACT_PROFILE'
+
+# Text files at least this large are streamed from a memory map instead of read into a str.
+# Kept well below the default max_file_kb, since files over that limit are truncated instead
+STREAM_BYTES = 256 * 1024
+# Bytes converted or written per step when streaming a memory-mapped file
+STREAM_CHUNK = 1024 * 1024
+
+# Leading bytes of common binary formats that can be free of NUL bytes in their first few KB.
+# Several are plain ASCII ("MZ", "ID3", ...), so a match only counts when the head is not text
+BINARY_MAGIC = (
+    b'\x89PNG', b'\xff\xd8\xff', b'GIF87a', b'GIF89a', b'%PDF-', b'PK\x03\x04', b'\x7fELF',
+    b'\x1f\x8b', b'BZh', b'\xfd7zXZ', b'7z\xbc\xaf', b'Rar!', b'MZ', b'\xca\xfe\xba\xbe',
+    b'\xcf\xfa\xed\xfe', b'\xce\xfa\xed\xfe', b'\x00asm', b'SQLite format 3', b'RIFF', b'OggS',
+    b'ID3', b'fLaC', b'wOFF', b'wOF2',
+)
+# C0 control bytes, other than backspace, tab, line breaks, form feed and escape, and DEL
+_CONTROL_BYTES = bytes(sorted(set(range(32)) - {8, 9, 10, 11, 12, 13, 27})) + b'\x7f'
+
+def get_global_ignore_path():
+    """Return the full path for the global ignore JSON file."""
+    return os.path.join(CONFIG_DIR, GLOBAL_IGNORE_FILE)
+
+def get_settings_path():
+    """Return the full path for the settings JSON file."""
+    return os.path.join(CONFIG_DIR, SETTINGS_FILE)
+
+def load_global_ignores():
+    """Load global ignore patterns from the JSON file, or return None if it does not exist."""
+    ignore_path = get_global_ignore_path()
+    if not os.path.exists(ignore_path):
+        return None
+    try:
+        with open(ignore_path, 'r', encoding='utf-8') as f:
+            ignores = json.load(f)
+        return ignores if isinstance(ignores, list) else []
+    except Exception:
+        return []
+
+def load_settings():
+    """Load settings from the JSON file, falling back to defaults for missing keys."""
+    settings = DEFAULT_SETTINGS.copy()
+    settings_path = get_settings_path()
+    if os.path.exists(settings_path):
+        try:
+            with open(settings_path, 'r', encoding='utf-8') as f:
+                loaded = json.load(f)
+            if isinstance(loaded, dict):
+                settings.update((k, v) for k, v in loaded.items() if k in settings)
+        except Exception:
+            pass
+    return settings
+
+# Patterns match case-insensitively where the platform does, as fnmatch.fnmatch does
+_IGNORE_CASE = os.path.normcase('A') == 'a'
+_GLOB_CHARS = frozenset('*?[\\')
+# Appended to directory subjects so dir-only patterns can be part of the same regex
+_DIR_MARK = '\0'
+
+def _translate_glob(pattern):
+    """Translate a gitignore-style glob into a regular expression fragment."""
+    out = []
+    i, n = 0, len(pattern)
+    while i < n:
+        c = pattern[i]
+        if c == '*':
+            j = i
+            while j < n and pattern[j] == '*':
+                j += 1
+            whole_segment = (i == 0 or pattern[i - 1] == '/') and (j == n or pattern[j] == '/')
+            if j - i == 2 and whole_segment:
+                if j == n:
+                    out.append('.+')  # Trailing "**" matches everything inside, not the directory itself
+                    i = j
+                else:
+                    out.append('(?:.*/)?')  # "**/" matches zero or more directories
+                    i = j + 1
+                continue
+            out.append('[^/\\x00]*')
+            i = j
+            continue
+        if c == '?':
+            out.append('[^/\\x00]')
+        elif c == '[':
+            j = i + 1
+            if j < n and pattern[j] in '!^':
+                j += 1
+            if j < n and pattern[j] == ']':
+                j += 1
+            while j < n and pattern[j] != ']':
+                j += 1
+            if j >= n:
+                out.append('\\[')
+            else:
+                body = pattern[i + 1:j]
+                if body[0] in '!^':
+                    body = '^' + body[1:]
+                out.append('[' + body.replace('[', '\\[') + ']')
+                i = j
+        elif c == '\\' and i + 1 < n:
+            i += 1
+            out.append(re.escape(pattern[i]))
+        else:
+            out.append(re.escape(c))
+        i += 1
+    return ''.join(out)
+
+def _parse_ignore_line(line):
+    """Parse one gitignore line into (pattern, negated, dir_only, anchored), or None."""
+    line = line.rstrip('\r\n')
+    if not line or line.startswith('#'):
+        return None
+    stripped = line.rstrip(' ')
+    if stripped.endswith('\\') and len(stripped) < len(line):
+        stripped += ' '  # Keep an escaped trailing space
+    line = stripped
+    negated = line.startswith('!')
+    if negated:
+        line = line[1:]
+    elif line.startswith(('\\!', '\\#')):
+        line = line[1:]
+    dir_only = line.endswith('/')
+    line = line.rstrip('/')
+    if not line:
+        return None
+    anchored = '/' in line
+    return line.lstrip('/'), negated, dir_only, anchored
+
+class IgnoreMatcher:
+    """Ignore patterns compiled once for fast per-entry matching.
+
+    Patterns follow .gitignore semantics: patterns without a slash match the
+    entry name at any depth, patterns with a slash are anchored to the
+    directory the patterns belong to, "**" spans directories, a trailing "/"
+    only matches directories and "!" re-includes an entry. The last matching
+    pattern wins.
+
+    Plain names such as ".git" and suffix patterns such as "*.tmp" are
+    resolved with dictionary lookups. All other patterns are combined into
+    one regex per kind, with the alternatives in reverse order so the first
+    alternative that matches is the last pattern in the list.
+    """
+    def __init__(self, patterns):
+        self.literals = {}
+        self.suffixes = {}
+        self.negated = []
+        name_parts = []
+        path_parts = []
+        for line in patterns:
+            rule = _parse_ignore_line(line)
+            if rule is None:
+                continue
+            pattern, negated, dir_only, anchored = rule
+            if _IGNORE_CASE:
+                pattern = pattern.lower()
+            index = len(self.negated)
+            self.negated.append(negated)
+            if not anchored and not _GLOB_CHARS.intersection(pattern):
+                self.literals[pattern + _DIR_MARK] = index
+                if not dir_only:
+                    self.literals[pattern] = index
+                continue
+            suffix = pattern[1:]
+            if not anchored and pattern[0] == '*' and suffix and not _GLOB_CHARS.intersection(suffix):
+                self.suffixes[suffix + _DIR_MARK] = index
+                if not dir_only:
+                    self.suffixes[suffix] = index
+                continue
+            dir_mark = re.escape(_DIR_MARK) + ('' if dir_only else '?')
+            fragment = f"(?P<r{index}>{_translate_glob(pattern)}{dir_mark})"
+            try:
+                re.compile(fragment)
+            except re.error:
+                continue  # A pattern such as "[z-a]" matches nothing, as in git
+            (path_parts if anchored else name_parts).append(fragment)
+        self.suffix_lengths = sorted({len(suffix) for suffix in self.suffixes})
+        self.name_regex = self._compile(name_parts)
+        self.path_regex = self._compile(path_parts)
+
+    @staticmethod
+    def _compile(parts):
+        if not parts:
+            return None
+        return re.compile('|'.join(reversed(parts)), re.DOTALL).fullmatch
+
+    @classmethod
+    def from_file(cls, path):
+        """Build a matcher from a .gitignore file, or return None if it cannot be read."""
+        try:
+            with open(path, 'r', encoding='utf-8', errors='replace') as f:
+                return cls(f.read().splitlines())
+        except OSError:
+            return None
+
+    def match(self, name, rel_path, is_dir):
+        """
+        Match an entry against the patterns.
+        Returns True if it is ignored, False if it is re-included and None if no pattern applies.
+        """
+        mark = _DIR_MARK if is_dir else ''
+        if _IGNORE_CASE:
+            name = name.lower()
+            rel_path = rel_path.lower()
+        subject = name + mark
+        best = self.literals.get(subject, -1)
+        for length in self.suffix_lengths:
+            if length > len(subject):
+                break
+            best = max(best, self.suffixes.get(subject[-length:], -1))
+        if self.name_regex is not None:
+            m = self.name_regex(subject)
+            if m:
+                best = max(best, int(m.lastgroup[1:]))
+        if self.path_regex is not None:
+            if os.sep != '/':
+                rel_path = rel_path.replace(os.sep, '/')
+            m = self.path_regex(rel_path + mark)
+            if m:
+                best = max(best, int(m.lastgroup[1:]))
+        if best < 0:
+            return None
+        return not self.negated[best]
+
+    def is_ignored(self, name, rel_path=None, is_dir=False):
+        """Return True if the entry is ignored by these patterns."""
+        return bool(self.match(name, name if rel_path is None else rel_path, is_dir))
+
+    def is_path_ignored(self, rel_path):
+        """Return True if a file, or any directory on its '/'-separated relative path, is ignored."""
+        parts = rel_path.split('/')
+        for i, name in enumerate(parts, 1):
+            if self.is_ignored(name, '/'.join(parts[:i]), i < len(parts)):
+                return True
+        return False
+
+# Rough tokenizer: words and runs of punctuation, with long runs costing one token per four characters
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]+")
+
+def estimate_tokens(text):
+    """Estimate how many LLM tokens a piece of text takes."""
+    return sum((len(piece) + 3) // 4 for piece in _TOKEN_RE.findall(text))
+
+class TokenEstimator:
+    """Estimate file token counts from their stat size and a per-extension bytes-per-token ratio.
+
+    The ratio for an extension is measured by sampling the start of the first
+    few files with that extension, so estimating any other file costs a
+    single stat call. Results are remembered per path. export_size() also
+    applies ReadLimits, which costs reading the start of each file once.
+    """
+    SAMPLE_BYTES = 4096
+    SAMPLES_PER_EXTENSION = 3
+    DEFAULT_BYTES_PER_TOKEN = 4.0
+
+    def __init__(self):
+        self.samples = {}  # extension -> [bytes sampled, tokens counted, files sampled]
+        self.file_estimates = {}  # path -> (size, tokens)
+        self.binary = {}  # path -> whether the file looks binary
+
+    def bytes_per_token(self, path, size):
+        """Return the bytes-per-token ratio for a file's extension, sampling the file if needed."""
+        extension = os.path.splitext(path)[1].lower()
+        sample = self.samples.setdefault(extension, [0, 0, 0])
+        if sample[2] < self.SAMPLES_PER_EXTENSION and size:
+            try:
+                with open(path, 'rb') as f:
+                    data = f.read(self.SAMPLE_BYTES)
+                sample[0] += len(data)
+                sample[1] += estimate_tokens(decode_text(data))
+                sample[2] += 1
+            except OSError:
+                pass
+        if not sample[1]:
+            return self.DEFAULT_BYTES_PER_TOKEN
+        return sample[0] / sample[1]
+
+    def file_tokens(self, path):
+        """Return (size in bytes, estimated tokens) for a file."""
+        estimate = self.file_estimates.get(path)
+        if estimate is None:
+            try:
+                size = os.stat(path).st_size
+            except OSError:
+                size = 0
+            tokens = math.ceil(size / self.bytes_per_token(path, size)) if size else 0
+            estimate = self.file_estimates[path] = (size, tokens)
+        return estimate
+
+    def export_size(self, path, limits=None):
+        """
+        Return (size in bytes, estimated tokens) of a file as an export writes it under ReadLimits:
+        skipped binary files cost their placeholder and oversized files the part that is kept.
+        """
+        size, tokens = self.file_tokens(path)
+        if limits is None or not size:
+            return size, tokens
+        if limits.skip_binary:
+            binary = self.binary.get(path)
+            if binary is None:
+                try:
+                    with open(path, 'rb', opener=_open_nonblocking) as f:
+                        binary = looks_binary(f.read(SNIFF_BYTES))
+                except OSError:
+                    binary = False
+                self.binary[path] = binary
+            if binary:
+                placeholder = f"[binary file, {size} bytes, skipped]"
+                return len(placeholder), estimate_tokens(placeholder)
+        if limits.is_oversized(size):
+            return limits.max_file_bytes, math.ceil(tokens * limits.max_file_bytes / size)
+        return size, tokens
+
+    def forget(self, path):
+        """Drop the remembered estimate for a file that may have changed."""
+        self.file_estimates.pop(path, None)
+        self.binary.pop(path, None)
+
+class ExportProfile:
+    """Counters and timers for the phases of a walk and export, overall and per directory.
+
+    Attach one to DirectorySnapshot.profile and pass it to the readers and to
+    write_export(); all hooks are skipped when there is no profile. Reader
+    threads share it, so updates take a lock.
+
+    Phases: listing (scandir or cache), ignore (matching and building nodes),
+    walk (the whole tree walk, including listing and ignore), read, decode,
+    hash (content hashing for deduplication), wait (the writer waiting for
+    readers) and write.
+    """
+    PHASES = ('listing', 'ignore', 'walk', 'read', 'decode', 'hash', 'wait', 'write')
+
+    def __init__(self):
+        self.seconds = dict.fromkeys(self.PHASES, 0.0)
+        self.counts = dict.fromkeys(self.PHASES, 0)
+        self.directories = {}  # path -> {'<phase>_s': seconds, other counters}
+        self.lock = threading.Lock()
+
+    def add(self, phase, seconds, directory=None, count=1, **counters):
+        """Record time spent in a phase, optionally charged to a directory along with extra counters."""
+        with self.lock:
+            self.seconds[phase] += seconds
+            self.counts[phase] += count
+            if directory is not None:
+                stats = self.directories.setdefault(directory, {})
+                key = phase + '_s'
+                stats[key] = stats.get(key, 0.0) + seconds
+                for name, value in counters.items():
+                    stats[name] = stats.get(name, 0) + value
+
+    def add_file(self, path, read_seconds, decode_seconds, bytes_read):
+        """Record reading and decoding one file."""
+        directory = os.path.dirname(path)
+        self.add('read', read_seconds, directory, files=1, bytes=bytes_read)
+        if decode_seconds:
+            self.add('decode', decode_seconds, directory)
+
+    def timed(self, items, phase):
+        """Yield from items, recording the time spent waiting for each one."""
+        iterator = iter(items)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            self.add(phase, time.perf_counter() - start)
+            yield item
+
+    def summary(self):
+        """One line with the time and count of every phase that ran."""
+        return ", ".join(f"{phase} {self.seconds[phase]:.2f}s ({self.counts[phase]})"
+                         for phase in self.PHASES if self.counts[phase])
+
+    def to_dict(self, root_path):
+        """Return the phases and the per-directory breakdown, costliest directory first."""
+        base_len = len(os.path.join(root_path, ''))
+        directories = []
+        for path, stats in self.directories.items():
+            entry = {'path': path[base_len:] or '.'}
+            entry.update(stats)
+            entry['total_s'] = sum(value for name, value in stats.items() if name.endswith('_s'))
+            directories.append(entry)
+        directories.sort(key=lambda entry: entry['total_s'], reverse=True)
+        return {
+            'phases': {phase: {'seconds': self.seconds[phase], 'count': self.counts[phase]}
+                       for phase in self.PHASES},
+            'directories': directories,
+        }
+
+    def save(self, path, root_path):
+        """Write to_dict() to a JSON file."""
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(root_path), f, indent=2)
+
+class ScanNode:
+    """A single file or directory captured by a DirectorySnapshot."""
+    __slots__ = ('name', 'path', 'is_dir', 'children', 'ignore_chain', 'size', 'tokens', 'parent', 'row',
+                 'depth', 'note')
+
+    def __init__(self, name, path, is_dir, ignore_chain=None, parent=None):
+        self.name = name
+        self.path = path
+        self.is_dir = is_dir
+        self.children = None  # Filled in the first time the directory is listed
+        # Containing directory node and index within its children, for tree models
+        self.parent = parent
+        self.row = 0
+        self.depth = parent.depth + 1 if parent is not None else 0
+        # Why a directory was not listed, or not listed in full, shown next to it in the tree
+        self.note = None
+        # (matcher, base path length) pairs that apply inside this directory, deepest first
+        self.ignore_chain = ignore_chain
+        # Bytes and estimated tokens (subtree totals for directories), set by compute_totals()
+        self.size = None
+        self.tokens = None
+
+def scan_dir(path):
+    """List a directory once with os.scandir; returns a list of (name, is_dir) pairs."""
+    listing = []
+    with os.scandir(path) as entries:
+        for entry in entries:
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                is_dir = False
+            listing.append((entry.name, is_dir))
+    return listing
+
+class SelectionModel:
+    """Which paths are selected, stored as marks rather than per-item state.
+
+    Every path is selected unless marked otherwise. A mark says whether a
+    path and everything below it is selected: excluded marks are the
+    exclusion prefixes and included marks are explicit re-inclusions. Each
+    mark carries a sequence number, and the newest mark among a path and its
+    ancestors decides, so changing a whole subtree is a single dictionary
+    write. A walk carries its parent's (selected, sequence) state down, which
+    makes each membership check a single lookup.
+    """
+    def __init__(self):
+        self.marks = {}  # path -> (selected, sequence number)
+        self.sequence = 0
+
+    @staticmethod
+    def _key(path):
+        return path.rstrip(os.sep) or path
+
+    def copy(self):
+        """Return an independent copy of the model."""
+        other = SelectionModel()
+        other.marks = dict(self.marks)
+        other.sequence = self.sequence
+        return other
+
+    def set_selected(self, path, selected):
+        """Select or deselect a path and everything below it."""
+        self.sequence += 1
+        self.marks[self._key(path)] = (selected, self.sequence)
+        return self.sequence
+
+    def state_of(self, path):
+        """Return the (selected, sequence) state of any path by checking its ancestors."""
+        path = self._key(path)
+        state = (True, 0)
+        while True:
+            mark = self.marks.get(path)
+            if mark is not None and mark[1] > state[1]:
+                state = mark
+            parent = os.path.dirname(path)
+            if parent == path or not parent:
+                return state
+            path = parent
+
+    def child_state(self, parent_state, path):
+        """Return the state of a path given the state inherited from its parent."""
+        mark = self.marks.get(path)
+        if mark is not None and mark[1] > parent_state[1]:
+            return mark
+        return parent_state
+
+    def marks_under(self, path, since):
+        """Yield the (selected, sequence) marks strictly below path that are newer than since."""
+        prefix = os.path.join(self._key(path), '')
+        for mark_path, mark in self.marks.items():
+            if mark[1] > since and mark_path.startswith(prefix):
+                yield mark
+
+    def has_marks_under(self, path, since):
+        """Return True if anything below path was marked after the given sequence number."""
+        return any(True for _ in self.marks_under(path, since))
+
+    def has_inclusions_under(self, path, since):
+        """Return True if something below path was re-included after the given sequence number."""
+        return any(selected for selected, _ in self.marks_under(path, since))
+
+    def is_selected(self, path):
+        """Return True if a path is selected."""
+        return self.state_of(path)[0]
+
+def selection_from_excludes(root_path, rel_paths):
+    """Build a SelectionModel that excludes paths given relative to the root."""
+    selection = SelectionModel()
+    for rel_path in rel_paths:
+        parts = [part for part in rel_path.replace(os.sep, '/').split('/') if part]
+        if parts:
+            selection.set_selected(os.path.join(root_path, *parts), False)
+    return selection
+
+class WalkLimits:
+    """Which directories a DirectorySnapshot lists.
+
+    Symlinked directories are only listed when follow_symlinks is set. Every
+    directory is identified by its (st_dev, st_ino) pair and listed once, so
+    a symlink loop, or a second link to the same directory, is never
+    descended. Directories more than max_depth levels below the root are not
+    listed, and listing stops once max_entries entries have been found
+    (0 means no limit for either).
+    """
+    def __init__(self, follow_symlinks=False, max_depth=0, max_entries=0):
+        self.follow_symlinks = follow_symlinks
+        self.max_depth = max_depth
+        self.max_entries = max_entries
+
+    @classmethod
+    def from_settings(cls, settings):
+        """Build WalkLimits from the settings dictionary."""
+        return cls(settings['follow_symlinks'], settings['max_depth'], settings['max_entries'])
+
+class DirectorySnapshot:
+    """In-memory snapshot of a directory tree built with os.scandir.
+
+    Every directory is listed at most once, using the cached DirEntry type
+    information instead of extra stat calls. The tree view, the file tree
+    text and the export all read from the same snapshot.
+
+    Entries are filtered with the global IgnoreMatcher and, when use_gitignore
+    is set, with the .gitignore file found in each listed directory. An
+    optional scan cache (see dirxtract_cache.RootCache) supplies listings of
+    directories that have not changed since the last scan.
+
+    WalkLimits decide which directories are listed. A directory that is
+    skipped, or cut short by the entry limit, gets a note explaining why.
+
+    Listing is serialised by a lock, so the tree view may list directories on
+    a background thread while a worker walks the same snapshot.
+    """
+    def __init__(self, root_path, matcher, use_gitignore=False, cache=None, walk_limits=None):
+        chain = ((matcher, len(os.path.join(root_path, ''))),)
+        self.root = ScanNode(os.path.basename(root_path), root_path, True, chain)
+        self.use_gitignore = use_gitignore
+        self.cache = cache
+        self.walk_limits = walk_limits or WalkLimits()
+        self.visited = {}  # (st_dev, st_ino) -> path of the directory listed with that identity
+        self.entry_count = 0
+        # Optional callable invoked with the path of every directory before it is scanned
+        self.listing_callback = None
+        # Optional ExportProfile charged with listing and ignore matching
+        self.profile = None
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def is_ignored(chain, name, path, is_dir):
+        """Check an entry against a matcher chain; the deepest deciding matcher wins."""
+        for matcher, base_len in chain:
+            result = matcher.match(name, path[base_len:], is_dir)
+            if result is not None:
+                return result
+        return False
+
+    def list_children(self, node):
+        """Return the sorted, filtered children of a directory node, scanning it on first use."""
+        if node.children is None:
+            with self.lock:
+                if node.children is None:
+                    node.children = self.scan_children(node)
+        return node.children
+
+    def display_path(self, path):
+        """Return a path the way the tree shows it, starting with the root's name."""
+        rel_path = path[len(os.path.join(self.root.path, '')):]
+        return '/'.join(filter(None, [self.root.name] + rel_path.split(os.sep)))
+
+    def skip_reason(self, node):
+        """Return why a directory node must not be listed under the WalkLimits, or None."""
+        limits = self.walk_limits
+        if limits.max_entries and self.entry_count >= limits.max_entries:
+            return "not listed: entry limit reached"
+        if limits.max_depth and node.depth > limits.max_depth:
+            return "not listed: depth limit reached"
+        if node is self.root:
+            info = os.stat(node.path)
+        else:
+            info = os.lstat(node.path)
+            if stat.S_ISLNK(info.st_mode):
+                if not limits.follow_symlinks:
+                    return "symlink, not followed"
+                info = os.stat(node.path)
+        if not info.st_ino:
+            return None  # No usable identity on this filesystem
+        key = (info.st_dev, info.st_ino)
+        first = self.visited.get(key)
+        if first is not None and first != node.path:
+            # The first directory may have been removed since and its inode reused
+            try:
+                info = os.stat(first)
+                if (info.st_dev, info.st_ino) != key:
+                    first = None
+            except OSError:
+                first = None
+        if first is None or first == node.path:
+            self.visited[key] = node.path
+            return None
+        if node.path.startswith(os.path.join(first, '')):
+            return "symlink loop, not followed"
+        return f"already listed at {self.display_path(first)}"
+
+    def scan_children(self, node):
+        """Scan a directory node and build its sorted, filtered child nodes."""
+        if self.listing_callback is not None:
+            self.listing_callback(node.path)
+        profile = self.profile
+        children = []
+        try:
+            start = time.perf_counter()
+            node.note = self.skip_reason(node)
+            if node.note is not None:
+                return children
+            if self.cache is not None:
+                listing = self.cache.list_dir(node.path)
+            else:
+                listing = scan_dir(node.path)
+            listed = time.perf_counter()
+            if profile is not None:
+                profile.add('listing', listed - start, node.path, entries=len(listing))
+            chain = node.ignore_chain
+            if self.use_gitignore and ('.gitignore', False) in listing:
+                matcher = IgnoreMatcher.from_file(os.path.join(node.path, '.gitignore'))
+                if matcher is not None:
+                    chain = ((matcher, len(os.path.join(node.path, ''))),) + chain
+            for name, is_dir in listing:
+                path = os.path.join(node.path, name)
+                if self.is_ignored(chain, name, path, is_dir):
+                    continue
+                children.append(ScanNode(name, path, is_dir, chain if is_dir else None, node))
+            if profile is not None:
+                profile.add('ignore', time.perf_counter() - listed, node.path, len(listing),
+                            ignored=len(listing) - len(children))
+            max_entries = self.walk_limits.max_entries
+            if max_entries and self.entry_count + len(children) > max_entries:
+                # Keep the entries that sort first, so the cut is the same on every walk
+                children.sort(key=lambda n: n.name.lower())
+                left_out = len(children) - (max_entries - self.entry_count)
+                del children[max_entries - self.entry_count:]
+                node.note = f"{left_out} more entries not listed: entry limit reached"
+            self.entry_count += len(children)
+        except PermissionError:
+            pass  # Skip directories without permission
+        except OSError as e:
+            print(f"Error accessing {node.path}: {e}")
+        children.sort(key=lambda n: n.name.lower())
+        for row, child in enumerate(children):
+            child.row = row
+        return children
+
+    def rescan(self, node):
+        """
+        List a directory node again after it changed on disk. Child nodes that are still
+        there are reused along with anything already listed below them. Returns the new
+        sorted children; updating node.children is left to the caller.
+        """
+        with self.lock:
+            self.entry_count -= len(node.children or ())
+            fresh = self.scan_children(node)
+        existing = {(child.name, child.is_dir): child for child in node.children or ()}
+        children = []
+        for child in fresh:
+            old = existing.get((child.name, child.is_dir))
+            if old is not None:
+                # The directory's .gitignore may have changed
+                old.ignore_chain = child.ignore_chain
+                child = old
+            children.append(child)
+        return children
+
+    def forget_totals(self, node):
+        """Clear the totals of a changed directory, its files and its ancestors."""
+        for child in node.children or ():
+            if not child.is_dir:
+                child.size = child.tokens = None
+        while node is not None:
+            node.size = node.tokens = None
+            node = node.parent
+
+    def selected_children(self, node, state, selection):
+        """
+        Return (child, state) pairs for the children of a directory node that are selected,
+        or that are deselected directories with something re-included below them.
+        """
+        children = self.list_children(node)
+        if selection is None:
+            return [(child, state) for child in children]
+        selected = []
+        for child in children:
+            child_state = selection.child_state(state, child.path)
+            if child_state[0] or (child.is_dir and selection.has_inclusions_under(child.path, child_state[1])):
+                selected.append((child, child_state))
+        return selected
+
+    def traverse_for_export(self, node, prefix="", is_last=True, relative_path="", selection=None,
+                            lines=None, files_dict=None, state=None):
+        """
+        Walk the snapshot depth first, with an explicit stack rather than recursion, to generate
+        the tree structure and collect file paths (for export). Directories that were not listed
+        in full are followed by their note.
+        Returns a tuple of (formatted lines, dict mapping relative paths to full file paths).
+        """
+        if lines is None:
+            lines = []
+        if files_dict is None:
+            files_dict = {}
+        if state is None:
+            state = selection.state_of(node.path) if selection is not None else (True, 0)
+        stack = [(node, prefix, is_last, relative_path, state)]
+        while stack:
+            node, prefix, is_last, relative_path, state = stack.pop()
+            line = f"{prefix}{'└── ' if is_last else '├── '}{node.name}"
+            if not node.is_dir:
+                lines.append(line)
+                if state[0]:
+                    files_dict[relative_path.replace(os.sep, "/")] = node.path
+                continue
+
+            children = self.selected_children(node, state, selection)
+            lines.append(f"{line}/  [{node.note}]" if node.note else line + "/")
+            new_prefix = prefix + ("    " if is_last else "│   ")
+            # Pushed last to first so they are popped in order
+            for i in range(len(children) - 1, -1, -1):
+                child, child_state = children[i]
+                new_rel = os.path.join(relative_path, child.name) if relative_path else child.name
+                stack.append((child, new_prefix, i == len(children) - 1, new_rel, child_state))
+        return lines, files_dict
+
+    def compute_totals(self, node, estimator, limits=None):
+        """
+        Fill in size and estimated token totals for a node and everything below it. Sizes are
+        read from disk; tokens are what an export under ReadLimits writes, as export_size() counts them.
+        Returns (size, tokens); nodes that already have totals are not revisited.
+        """
+        stack = [(node, False)]
+        while stack:
+            current, children_done = stack.pop()
+            if current.tokens is not None:
+                continue
+            if not current.is_dir:
+                current.size = estimator.file_tokens(current.path)[0]
+                current.tokens = estimator.export_size(current.path, limits)[1]
+                continue
+            children = self.list_children(current)
+            pending = [child for child in children if child.tokens is None]
+            if children_done and not pending:
+                current.size = sum(child.size for child in children)
+                current.tokens = sum(child.tokens for child in children)
+            else:
+                stack.append((current, True))
+                stack.extend((child, False) for child in pending)
+        return node.size, node.tokens
+
+    def format_tree(self, relative_root, selection=None):
+        """Walk the whole snapshot; returns (tree lines, dict of relative paths to full file paths)."""
+        start = time.perf_counter()
+        result = self.traverse_for_export(
+            self.root, prefix="", is_last=True, relative_path=relative_root, selection=selection
+        )
+        if self.profile is not None:
+            self.profile.add('walk', time.perf_counter() - start)
+        return result
+
+def decode_text(data):
+    """Decode file bytes as UTF-8, falling back to latin1, with text-mode newline translation."""
+    try:
+        text = data.decode('utf-8')
+    except UnicodeDecodeError:
+        text = data.decode('latin1')
+    if '\r' in text:
+        text = text.replace('\r\n', '\n').replace('\r', '\n')
+    return text
+
+def fit_to_budget(snapshot, relative_root, selection, budget, estimator, strategy='largest',
+                  low_priority=None, limits=None):
+    """
+    Deselect files until the estimated size of the export fits within budget tokens.
+    Files are costed as written under ReadLimits, if given (see TokenEstimator.export_size()).
+    With the 'priority' strategy files matching the low_priority IgnoreMatcher go first;
+    otherwise, and after those, the largest files are dropped first.
+    Returns (tree lines, files dict, list of dropped relative paths), like format_tree().
+    """
+    lines, files_dict = snapshot.format_tree(relative_root, selection)
+    tokens = {rel_path: estimator.export_size(full_path, limits)[1] for rel_path, full_path in files_dict.items()}
+    # Each file is wrapped in <rel_path> tags, roughly a quarter token per character
+    total = estimate_tokens("\n".join(lines)) + sum(
+        count + (2 * len(rel_path) + 10) // 4 for rel_path, count in tokens.items()
+    )
+    if total <= budget:
+        return lines, files_dict, []
+
+    base_len = len(os.path.join(snapshot.root.path, ''))
+
+    def is_low_priority(full_path):
+        return (low_priority is not None and strategy == 'priority'
+                and low_priority.is_path_ignored(full_path[base_len:].replace(os.sep, '/')))
+
+    order = sorted(files_dict, key=lambda rel: (not is_low_priority(files_dict[rel]), -tokens[rel]))
+    dropped = []
+    selection = selection.copy() if selection is not None else SelectionModel()
+    for rel_path in order:
+        if total <= budget:
+            break
+        selection.set_selected(files_dict[rel_path], False)
+        total -= tokens[rel_path] + (2 * len(rel_path) + 10) // 4
+        dropped.append(rel_path)
+    lines, files_dict = snapshot.format_tree(relative_root, selection)
+    return lines, files_dict, dropped
+
+class ReadLimits:
+    """How binary and oversized files are handled when their contents are read.
+
+    Binary files are recognised from the first SNIFF_BYTES of the file, by NUL
+    bytes or a known magic number followed by bytes that are not text, and
+    replaced by a one-line placeholder.
+    Text files over max_file_bytes keep half the limit from their start and
+    half from their end. Other text files of STREAM_BYTES or more come back as
+    a MappedText. max_total_chars is applied by limit_total_size().
+    """
+    def __init__(self, skip_binary=True, max_file_bytes=0, max_total_chars=0):
+        self.skip_binary = skip_binary
+        self.max_file_bytes = max_file_bytes
+        self.max_total_chars = max_total_chars
+
+    @classmethod
+    def from_settings(cls, settings):
+        """Build ReadLimits from the settings dictionary."""
+        return cls(settings['skip_binary'], settings['max_file_kb'] * 1024,
+                   settings['max_total_mb'] * 1024 * 1024)
+
+    def is_oversized(self, size):
+        return bool(self.max_file_bytes) and size > self.max_file_bytes
+
+def looks_binary(head):
+    """
+    Return True if the first bytes of a file look like a binary format: they hold a NUL byte,
+    or start with a known magic number and also hold control bytes or invalid UTF-8.
+    """
+    if b'\0' in head:
+        return True
+    if not head.startswith(BINARY_MAGIC):
+        return False
+    if len(head.translate(None, _CONTROL_BYTES)) != len(head):
+        return True
+    try:
+        # Incremental, so a character cut off at the end of the head is not an error
+        codecs.getincrementaldecoder('utf-8')().decode(head)
+    except UnicodeDecodeError:
+        return True
+    return False
+
+def _utf8_end(data):
+    """Return where data stops holding whole UTF-8 characters, dropping a sequence cut off at its end."""
+    start = len(data)
+    # Back off to the start of the last sequence, as ExportIndex.find_pages() does
+    while start > 0 and len(data) - start < 3 and data[start - 1] & 0xC0 == 0x80:
+        start -= 1
+    if start == 0:
+        return len(data)
+    lead = data[start - 1]
+    if lead < 0xC0:
+        return len(data)  # ASCII, or not UTF-8 at all
+    length = 2 if lead < 0xE0 else 3 if lead < 0xF0 else 4
+    return len(data) if len(data) - start + 1 >= length else start - 1
+
+def _utf8_start(data):
+    """Return where the first whole UTF-8 character of data starts, skipping continuation bytes."""
+    start = 0
+    while start < min(3, len(data)) and data[start] & 0xC0 == 0x80:
+        start += 1
+    return start
+
+def read_head_and_tail(f, size, head, max_bytes):
+    """
+    Read half of max_bytes from each end of an open binary file, cut at line boundaries.
+    head holds bytes already read from the start. Returns (text, bytes read).
+    """
+    half = max_bytes // 2
+    if len(head) < half:
+        head += f.read(half - len(head))
+    else:
+        head = head[:half]
+    f.seek(size - half)
+    tail = f.read(half)
+    bytes_read = len(head) + len(tail)
+    # Whole lines only, which also keeps multi-byte characters intact
+    cut = head.rfind(b'\n')
+    if cut >= 0:
+        head = head[:cut + 1]
+    else:
+        head = head[:_utf8_end(head)]
+    cut = tail.find(b'\n')
+    if cut >= 0:
+        tail = tail[cut + 1:]
+    else:
+        tail = tail[_utf8_start(tail):]
+    omitted = size - len(head) - len(tail)
+    text = f"{decode_text(head)}[... {omitted} bytes truncated ...]\n{decode_text(tail)}"
+    return text, bytes_read
+
+class MappedText:
+    """The text of a large file, streamed from a memory map instead of held as a str.
+
+    The file is checked once on the reader thread: whether it is valid UTF-8,
+    whether it contains carriage returns, and how many characters it decodes
+    to. write_to() then copies it to a binary handle chunk by chunk. UTF-8
+    files without carriage returns are written straight from the map; other
+    files get newline translation and latin1 conversion one chunk at a time,
+    so the output matches decode_text() without the whole text in memory.
+    """
+    def __init__(self, f, size):
+        self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.size = len(self.map)  # May differ from the stat size if the file just changed
+        self.encoding = 'utf-8'
+        self.has_cr = self.map.find(b'\r') >= 0
+        try:
+            chars = self.count_utf8_chars()
+        except UnicodeDecodeError:
+            self.encoding = 'latin1'
+            chars = self.size
+        if self.has_cr:
+            chars -= self.count_crlf()
+        self.char_count = chars
+
+    def __len__(self):
+        return self.char_count
+
+    def chunks(self):
+        view = memoryview(self.map)
+        try:
+            for start in range(0, self.size, STREAM_CHUNK):
+                yield view[start:start + STREAM_CHUNK]
+        finally:
+            view.release()
+
+    def count_utf8_chars(self):
+        decoder = codecs.getincrementaldecoder('utf-8')()
+        chars = 0
+        for chunk in self.chunks():
+            chars += len(decoder.decode(chunk))
+        return chars + len(decoder.decode(b'', True))
+
+    def count_crlf(self):
+        count = 0
+        previous_cr = False
+        for chunk in self.chunks():
+            data = chunk.tobytes()
+            count += data.count(b'\r\n') + (previous_cr and data.startswith(b'\n'))
+            previous_cr = data.endswith(b'\r')
+        return count
+
+    def translated_chunks(self):
+        """Yield the file's bytes as UTF-8 with '\r\n' and '\r' turned into '\n'."""
+        if not self.has_cr and self.encoding == 'utf-8':
+            yield from self.chunks()
+            return
+        pending_cr = False
+        for chunk in self.chunks():
+            data = chunk.tobytes()
+            if self.has_cr:
+                if pending_cr:
+                    data = b'\r' + data
+                # A trailing '\r' may be the first half of a '\r\n' split across chunks
+                pending_cr = data.endswith(b'\r')
+                if pending_cr:
+                    data = data[:-1]
+                data = data.replace(b'\r\n', b'\n').replace(b'\r', b'\n')
+            if self.encoding != 'utf-8':
+                data = data.decode(self.encoding).encode('utf-8')
+            yield data
+        if pending_cr:
+            yield b'\n'
+
+    def write_to(self, out):
+        """Write the text to a text handle, through its binary buffer when it has one."""
+        buffer = getattr(out, 'buffer', None)
+        if buffer is None:
+            out.write(str(self))
+            return
+        out.flush()
+        for data in self.translated_chunks():
+            buffer.write(data)
+
+    def close(self):
+        self.map.close()
+
+    def __str__(self):
+        return decode_text(self.map[:])
+
+def read_limited(f, size, limits, profile=None):
+    """
+    Read an open binary file of the given size under ReadLimits.
+    Returns (text, bytes read, whether text holds the complete file).
+    """
+    start = time.perf_counter()
+    head = f.read(SNIFF_BYTES)
+    result = None
+    decoded = True
+    if limits.skip_binary and looks_binary(head):
+        result = f"[binary file, {size} bytes, skipped]", len(head), False
+        decoded = False
+    elif limits.is_oversized(size):
+        # Decoding the head and tail is counted as reading
+        text, bytes_read = read_head_and_tail(f, size, head, limits.max_file_bytes)
+        result = text, bytes_read, False
+        decoded = False
+    read_end = time.perf_counter()
+    if result is None and size >= STREAM_BYTES:
+        # Mapping the file and checking its encoding is counted as decoding
+        try:
+            result = MappedText(f, size), size, False
+        except (OSError, ValueError):
+            f.seek(len(head))  # Not mappable, e.g. a special file; read it normally
+    if result is None:
+        data = head + f.read()
+        read_end = time.perf_counter()
+        result = decode_text(data), len(data), True
+    if profile is not None:
+        decode_seconds = time.perf_counter() - read_end if decoded else 0
+        profile.add_file(f.name, read_end - start, decode_seconds, result[1])
+    return result
+
+# Placeholder for devices, FIFOs and sockets, which may never end or block forever
+SPECIAL_FILE_TEXT = "[special file, skipped]"
+
+def _open_nonblocking(path, flags):
+    """Opener for open() that does not wait for a writer when the path is a FIFO."""
+    return os.open(path, flags | getattr(os, 'O_NONBLOCK', 0))
+
+def read_file_text(full_path, limits=None, profile=None):
+    """
+    Read a file once as bytes and decode it as UTF-8, falling back to latin1.
+    With ReadLimits, binary files give a placeholder, files over the size limit are
+    truncated and other large files come back as a MappedText to be streamed.
+    Anything but a regular file gives a placeholder without being read.
+    Time spent is recorded in an ExportProfile, if given.
+    Returns a tuple of (text, size in bytes); unreadable files give a short error message.
+    """
+    start = time.perf_counter()
+    try:
+        with open(full_path, 'rb', opener=_open_nonblocking) as f:
+            info = os.fstat(f.fileno())
+            if not stat.S_ISREG(info.st_mode):
+                return SPECIAL_FILE_TEXT, 0
+            if limits is not None:
+                text, bytes_read, _ = read_limited(f, info.st_size, limits, profile)
+                return text, bytes_read
+            data = f.read()
+    except Exception as e:
+        return f"Could not read file: {e}", 0
+    read_end = time.perf_counter()
+    text = decode_text(data)
+    if profile is not None:
+        profile.add_file(full_path, read_end - start, time.perf_counter() - read_end, len(data))
+    return text, len(data)
+
+def iter_file_contents(files, workers=DEFAULT_SETTINGS['read_workers'], reader=read_file_text):
+    """
+    Read (rel_path, full_path) pairs on a thread pool using reader (read_file_text by default).
+    Yields (rel_path, text, size) tuples in the same order as the input. Only a
+    few reads per worker are in flight at once, so results never run far ahead
+    of the consumer.
+    """
+    if workers <= 1:
+        for rel_path, full_path in files:
+            yield (rel_path,) + reader(full_path)
+        return
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        try:
+            for rel_path, full_path in files:
+                pending.append((rel_path, pool.submit(reader, full_path)))
+                if len(pending) >= workers * 4:
+                    rel_path, future = pending.popleft()
+                    yield (rel_path,) + future.result()
+            while pending:
+                rel_path, future = pending.popleft()
+                yield (rel_path,) + future.result()
+        finally:
+            # Reached when the consumer stops early; drop reads that have not started
+            for _, future in pending:
+                future.cancel()
+
+def limit_total_size(rel_paths, contents, max_chars):
+    """
+    Pass (rel_path, text, size) items through until their text would exceed max_chars,
+    then stop reading and give the remaining paths a placeholder instead.
+    rel_paths lists every path contents will produce, in order.
+    """
+    total = done = 0
+    try:
+        for rel_path, content, size in contents:
+            total += len(content)
+            if total > max_chars:
+                break
+            done += 1
+            yield rel_path, content, size
+        else:
+            return
+    finally:
+        contents.close()
+    for rel_path in rel_paths[done:]:
+        yield rel_path, "[left out: export size limit reached]", 0
+
+def content_digest(content):
+    """Hash the text an export writes for a file, reading a MappedText chunk by chunk."""
+    digest = hashlib.blake2b(digest_size=16)
+    if isinstance(content, MappedText):
+        for data in content.translated_chunks():
+            digest.update(data)
+    else:
+        digest.update(content.encode('utf-8'))
+    return digest.digest()
+
+class ContentDeduplicator:
+    """Write each distinct file content once, and a reference to it for later copies.
+
+    wrap_reader() hashes contents on the reader threads as they are read.
+    filter() then passes (rel_path, text, size) items through in export order
+    and replaces the text of a file whose content was already written with a
+    one-line reference to the first file that had it. Files shorter than
+    min_chars, and placeholders added after reading, are always written out.
+    """
+    def __init__(self, min_chars=DEDUPE_MIN_CHARS, profile=None):
+        self.min_chars = min_chars
+        self.profile = profile
+        self.digests = {}  # full path -> content digest, set by the reader threads
+        self.duplicates = 0
+        self.chars_saved = 0
+
+    def wrap_reader(self, reader):
+        """Return a reader that also records the digest of every content it reads."""
+        def read(full_path):
+            text, size = reader(full_path)
+            if len(text) >= self.min_chars:
+                start = time.perf_counter()
+                self.digests[full_path] = content_digest(text)
+                if self.profile is not None:
+                    self.profile.add('hash', time.perf_counter() - start, os.path.dirname(full_path))
+            return text, size
+        return read
+
+    def filter(self, contents, files_dict):
+        """Replace repeated contents with references; files_dict maps rel_paths to full paths."""
+        first = {}  # digest -> rel_path of the first file written with it
+        try:
+            for rel_path, content, size in contents:
+                digest = self.digests.pop(files_dict[rel_path], None)
+                if digest is not None:
+                    original = first.setdefault(digest, rel_path)
+                    if original != rel_path:
+                        self.duplicates += 1
+                        self.chars_saved += len(content)
+                        if isinstance(content, MappedText):
+                            content.close()
+                        content = f"[same content as {original}]"
+                yield rel_path, content, size
+        finally:
+            contents.close()
+
+def write_export(out, tree_text, contents, profile=None):
+    """
+    Stream an export to a text file handle.
+    Writes the separator and tree, then one <rel_path> block per (rel_path, text, size)
+    item as it arrives, so only one file's text is held at a time. MappedText items
+    are streamed to the handle and closed. With an ExportProfile, time spent waiting
+    for contents and time spent writing are recorded separately.
+    Returns the number of characters written.
+    """
+    start = time.perf_counter()
+    if profile is not None:
+        waited_before = profile.seconds['wait']
+        contents = profile.timed(contents, 'wait')
+    header = f"{EXPORT_SEPARATOR}{tree_text}\n\n"
+    out.write(header)
+    char_count = len(header)
+    files_written = 0
+    for rel_path, content, _size in contents:
+        opening = f"<{rel_path}>\n"
+        closing = f"\n</{rel_path}>\n\n"
+        out.write(opening)
+        if isinstance(content, MappedText):
+            try:
+                content.write_to(out)
+            finally:
+                content.close()
+        else:
+            out.write(content)
+        out.write(closing)
+        char_count += len(opening) + len(content) + len(closing)
+        files_written += 1
+    out.write(EXPORT_SEPARATOR)
+    if profile is not None:
+        waited = profile.seconds['wait'] - waited_before
+        profile.add('write', time.perf_counter() - start - waited, count=files_written)
+    return char_count + len(EXPORT_SEPARATOR)
+
+def plan_parts(rel_paths, costs, limit, first_cost=0):
+    """
+    Divide files, in export order, into parts whose costs add up to at most limit.
+    A directory whose files fit in one part is never divided; a larger one is divided
+    between its subdirectories the same way, so related files stay together.
+    first_cost is taken up in the first part by the tree, and a file over the limit
+    gets a part of its own. Returns a list of lists of rel_paths, at least one.
+    """
+    split_paths = [rel_path.split('/') for rel_path in rel_paths]
+    cumulative = [0]
+    for cost in costs:
+        cumulative.append(cumulative[-1] + cost)
+    units = []  # (start, end) ranges of files that go in the same part
+    # (start, end, depth) ranges still to be divided at depth, or None for a finished unit
+    stack = [(0, len(rel_paths), 0)]
+    while stack:
+        start, end, depth = stack.pop()
+        if depth is None:
+            units.append((start, end))
+            continue
+        pieces = []
+        i = start
+        while i < end:
+            name = split_paths[i][depth] if len(split_paths[i]) > depth + 1 else None
+            j = i + 1
+            if name is not None:
+                while j < end and len(split_paths[j]) > depth + 1 and split_paths[j][depth] == name:
+                    j += 1
+                if j - i > 1 and cumulative[j] - cumulative[i] > limit:
+                    pieces.append((i, j, depth + 1))
+                    i = j
+                    continue
+            pieces.append((i, j, None))
+            i = j
+        # Pushed last to first so they are popped in order
+        stack.extend(reversed(pieces))
+    parts = [[]]
+    used = first_cost
+    for start, end in units:
+        cost = cumulative[end] - cumulative[start]
+        if used and used + cost > limit:
+            parts.append([])
+            used = 0
+        parts[-1].extend(rel_paths[start:end])
+        used += cost
+    return parts
+
+def part_path(output_path, number, count):
+    """Return the path of a numbered part: export.txt becomes export.part01.txt and so on."""
+    base, extension = os.path.splitext(output_path)
+    return f"{base}.part{number:0{max(2, len(str(count)))}d}{extension}"
+
+def _put(items, future, item):
+    """Queue an item for a part writer, re-raising the writer's error if it has stopped."""
+    while True:
+        try:
+            items.put(item, timeout=0.1)
+            return
+        except queue.Full:
+            if future.done():
+                future.result()
+                raise RuntimeError("part writer stopped early")
+
+def write_parts(output_path, tree_text, contents, parts, profile=None):
+    """
+    Stream an export divided by plan_parts() into numbered part files next to output_path.
+    Every part is laid out like a whole export and headed by its number; the first one
+    holds the tree. Each part has its own writer thread fed through a bounded queue, so
+    a filled part is still being written while the next one fills.
+    Returns a list of (part path, characters written).
+    """
+    count = len(parts)
+    part_of = {rel_path: number for number, part in enumerate(parts) for rel_path in part}
+    paths = [part_path(output_path, number, count) for number in range(1, count + 1)]
+
+    def write_part(number, items):
+        header = f"[part {number + 1} of {count}]"
+        header += f"\n{tree_text}" if number == 0 else ", file tree in part 1"
+        with open(paths[number], 'w', encoding='utf-8', newline='') as out:
+            return write_export(out, header, iter(items.get, None))
+
+    start = time.perf_counter()
+    if profile is not None:
+        waited_before = profile.seconds['wait']
+        contents = profile.timed(contents, 'wait')
+    writers = []  # (queue, future) of every part started so far
+    files_written = 0
+    with ThreadPoolExecutor(max_workers=SPLIT_WRITERS) as pool:
+        def start_part():
+            if writers:
+                _put(*writers[-1], None)
+            items = queue.Queue(SPLIT_QUEUE_ITEMS)
+            writers.append((items, pool.submit(write_part, len(writers), items)))
+
+        try:
+            for item in contents:
+                number = part_of[item[0]]
+                while len(writers) <= number:
+                    start_part()
+                _put(*writers[number], item)
+                files_written += 1
+            while len(writers) < count:
+                start_part()
+        finally:
+            if writers:
+                _put(*writers[-1], None)
+        char_counts = [future.result() for _, future in writers]
+    if profile is not None:
+        waited = profile.seconds['wait'] - waited_before
+        profile.add('write', time.perf_counter() - start - waited, count=files_written)
+    return list(zip(paths, char_counts))
+
+def select_export_files(snapshot, relative_root, selection=None, token_budget=0, budget_strategy='largest',
+                        low_priority=None, limits=None, estimator=None):
+    """
+    Walk a snapshot for an export. A positive token_budget drops files as described in
+    fit_to_budget(). Returns (tree lines, files dict, list of dropped relative paths).
+    """
+    if token_budget > 0:
+        return fit_to_budget(snapshot, relative_root, selection, token_budget, estimator or TokenEstimator(),
+                             budget_strategy, low_priority, limits)
+    lines, files_dict = snapshot.format_tree(relative_root, selection)
+    return lines, files_dict, []
+
+def read_export_contents(files_dict, read_workers=DEFAULT_SETTINGS['read_workers'], cache=None, limits=None,
+                         profile=None, dedupe=False):
+    """
+    Set up reading the files of an export on a thread pool, from a RootCache if given, under
+    ReadLimits, deduplicated when dedupe is set (see ContentDeduplicator) and capped at the
+    limits' total size. Returns an iterator of (rel_path, text, size) items in export order.
+    """
+    reader = functools.partial(read_file_text if cache is None else cache.read_file_text,
+                               limits=limits, profile=profile)
+    deduplicator = ContentDeduplicator(profile=profile) if dedupe else None
+    if deduplicator is not None:
+        reader = deduplicator.wrap_reader(reader)
+    contents = iter_file_contents(files_dict.items(), read_workers, reader)
+    if deduplicator is not None:
+        contents = deduplicator.filter(contents, files_dict)
+    if limits is not None and limits.max_total_chars:
+        contents = limit_total_size(list(files_dict), contents, limits.max_total_chars)
+    return contents
+
+def prepare_export(path, matcher, use_gitignore=DEFAULT_SETTINGS['use_gitignore'],
+                   read_workers=DEFAULT_SETTINGS['read_workers'], selection=None, cache=None,
+                   token_budget=0, budget_strategy='largest', low_priority=None, limits=None,
+                   profile=None, dedupe=False, estimator=None, walk_limits=None):
+    """
+    Walk a directory and set up reading its files for an export, without any GUI.
+    When a RootCache is given, unchanged listings and contents come from it.
+    A positive token_budget drops files as described in fit_to_budget(),
+    ReadLimits decide how binary and large files are read, WalkLimits which
+    directories are listed, dedupe writes repeated contents once (see
+    ContentDeduplicator) and an ExportProfile collects timings. The GUI runs
+    the same select_export_files() and read_export_contents() on its own snapshot.
+    Returns (tree lines, dict of relative paths to full file paths, iterator of
+    (rel_path, text, size) items in export order).
+    """
+    snapshot = DirectorySnapshot(path, matcher, use_gitignore, cache, walk_limits)
+    snapshot.profile = profile
+    lines, files_dict, _ = select_export_files(
+        snapshot, os.path.basename(path), selection, token_budget, budget_strategy, low_priority, limits,
+        estimator
+    )
+    contents = read_export_contents(files_dict, read_workers, cache, limits, profile, dedupe)
+    return lines, files_dict, contents
+
+def export_directory(path, out, matcher, use_gitignore=DEFAULT_SETTINGS['use_gitignore'],
+                     read_workers=DEFAULT_SETTINGS['read_workers'], selection=None, cache=None,
+                     token_budget=0, budget_strategy='largest', low_priority=None, limits=None,
+                     profile=None, dedupe=False, walk_limits=None):
+    """
+    Export a whole directory to a text file handle without any GUI.
+    The options are described in prepare_export().
+    Returns the number of characters written.
+    """
+    lines, _, contents = prepare_export(
+        path, matcher, use_gitignore, read_workers, selection, cache, token_budget,
+        budget_strategy, low_priority, limits, profile, dedupe, walk_limits=walk_limits
+    )
+    return write_export(out, "\n".join(lines), contents, profile)
+
+def export_directory_split(path, output_path, matcher, part_chars=0, part_tokens=0, **options):
+    """
+    Export a whole directory into numbered part files of at most part_chars characters,
+    or part_tokens estimated tokens, each. Part sizes are planned from file sizes before
+    anything is read (see plan_parts()); the other options are those of prepare_export().
+    Returns a list of (part path, characters written).
+    """
+    estimator = TokenEstimator()
+    lines, files_dict, contents = prepare_export(path, matcher, estimator=estimator, **options)
+    tree_text = "\n".join(lines)
+    limits = options.get('limits')
+    costs = []
+    for rel_path, full_path in files_dict.items():
+        size, tokens = estimator.export_size(full_path, limits)
+        # Each file is wrapped in <rel_path> tags
+        if part_tokens:
+            costs.append(tokens + (2 * len(rel_path) + 10) // 4)
+        else:
+            costs.append(size + 2 * len(rel_path) + 9)
+    if part_tokens:
+        parts = plan_parts(list(files_dict), costs, part_tokens, estimate_tokens(tree_text))
+    else:
+        parts = plan_parts(list(files_dict), costs, part_chars, len(tree_text))
+    return write_parts(output_path, tree_text, contents, parts, options.get('profile'))
+
+class ExportIndex:
+    """Page and file offsets into a streamed export file, read through a memory map.
+
+    Pages are about page_bytes long and end after a line break (or, inside a
+    very long line, on a character boundary), so a viewer only decodes the
+    page it shows. files lists (rel_path, byte offset of its <rel_path> line)
+    in export order; each opening tag is searched for after the previous one.
+    """
+    def __init__(self, path, rel_paths=(), page_bytes=VIEW_PAGE_BYTES):
+        self.path = path
+        self.file = open(path, 'rb')
+        self.size = os.fstat(self.file.fileno()).st_size
+        # An empty file cannot be mapped
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if self.size else b''
+        self.pages = self.find_pages(page_bytes)
+        self.files = self.find_files(rel_paths)
+
+    def find_pages(self, page_bytes):
+        pages = [0]
+        while pages[-1] + page_bytes < self.size:
+            cut = pages[-1] + page_bytes
+            newline = self.map.find(b'\n', cut, cut + page_bytes)
+            if newline >= 0:
+                cut = newline + 1
+            else:
+                # Back off to the start of a UTF-8 sequence
+                while self.map[cut] & 0xC0 == 0x80:
+                    cut -= 1
+            if cut >= self.size:
+                break
+            pages.append(cut)
+        return pages
+
+    def find_files(self, rel_paths):
+        files = []
+        pos = 0
+        for rel_path in rel_paths:
+            tag = f"\n<{rel_path}>\n".encode('utf-8')
+            found = self.map.find(tag, pos)
+            if found >= 0:
+                files.append((rel_path, found + 1))
+                pos = found + len(tag)
+        return files
+
+    def page_of(self, offset):
+        """Return the page holding a byte offset."""
+        return bisect.bisect_right(self.pages, offset) - 1
+
+    def page_range(self, page):
+        end = self.pages[page + 1] if page + 1 < len(self.pages) else self.size
+        return self.pages[page], end
+
+    def file_range(self, index):
+        """Return the byte range of a file's block, from its opening to its closing tag line."""
+        start = self.files[index][1]
+        if index + 1 < len(self.files):
+            end = self.files[index + 1][1] - 1
+        else:
+            end = self.size - len(EXPORT_SEPARATOR) - 1
+        return start, end
+
+    def text(self, start=0, end=None):
+        """Decode a byte range of the export (the whole export by default)."""
+        return self.map[start:self.size if end is None else end].decode('utf-8', 'replace')
+
+    def close(self):
+        if isinstance(self.map, mmap.mmap):
+            self.map.close()
+        self.file.close()
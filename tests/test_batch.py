@@ -0,0 +1,40 @@
+"""Tests for reading batch manifests."""
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from dirxtract_batch import ManifestError, load_manifest  # noqa: E402
+
+def write_manifest(tmp_path, manifest):
+    path = tmp_path / 'manifest.json'
+    path.write_text(json.dumps(manifest), encoding='utf-8')
+    return str(path)
+
+@pytest.mark.parametrize('options', [
+    {'ignore': '*.py'},
+    {'exclude': ['docs', 3]},
+    {'dedupe': 'yes'},
+    {'token_budget': '1000'},
+    {'max_file_kb': True},
+    {'read_workers': 0},
+    {'max_depth': -1},
+])
+def test_options_of_the_wrong_type_are_rejected(tmp_path, options):
+    with pytest.raises(ManifestError):
+        load_manifest(write_manifest(tmp_path, {'roots': [dict(options, path='src')]}))
+    with pytest.raises(ManifestError):
+        load_manifest(write_manifest(tmp_path, {'defaults': options, 'roots': ['src']}))
+
+def test_valid_options_are_passed_to_the_job(tmp_path):
+    manifest = {'defaults': {'ignore': ['*.lock'], 'global_ignores': False, 'max_file_kb': None},
+                'roots': [{'path': 'src', 'exclude': ['docs'], 'token_budget': 500, 'dedupe': True}]}
+    output_dir, (job,) = load_manifest(write_manifest(tmp_path, manifest))
+    assert output_dir == str(tmp_path / 'exports')
+    assert job['patterns'] == ['*.lock']
+    assert job['exclude'] == ['docs']
+    assert job['token_budget'] == 500
+    assert job['settings']['dedupe_files'] is True
@@ -0,0 +1,39 @@
+"""Tests for binary detection and size limits when file contents are read or counted under ReadLimits."""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from dirxtract_core import (  # noqa: E402
+    DirectorySnapshot, IgnoreMatcher, ReadLimits, TokenEstimator, estimate_tokens, looks_binary, read_file_text
+)
+
+def test_text_starting_with_ascii_magic_is_exported(tmp_path):
+    path = tmp_path / 'countries.csv'
+    path.write_bytes(b'MZ,Mozambique\nNA,Namibia\n')
+    text, size = read_file_text(str(path), ReadLimits())
+    assert text == 'MZ,Mozambique\nNA,Namibia\n'
+    assert size == 25
+
+def test_ascii_magic_followed_by_binary_bytes_is_skipped(tmp_path):
+    path = tmp_path / 'tool.exe'
+    path.write_bytes(b'MZ\x90\x03\xff\xff\xb8' + b'\x40' * 50)
+    text, _ = read_file_text(str(path), ReadLimits())
+    assert text.startswith('[binary file,')
+
+def test_magic_and_nul_detection():
+    assert looks_binary(b'\x89PNG\r\n\x1a\n')
+    assert looks_binary(b'plain text\0with a NUL')
+    assert not looks_binary(b'ID3 tags are described below\n')
+    assert not looks_binary('RIFF chunks — an overview\n'.encode('utf-8'))
+
+def test_totals_count_tokens_as_exported(tmp_path):
+    (tmp_path / 'image.png').write_bytes(b'\x89PNG\r\n\x1a\n' + bytes(range(256)) * 64)
+    (tmp_path / 'big.txt').write_text('word ' * 4000, encoding='utf-8')
+    snapshot = DirectorySnapshot(str(tmp_path), IgnoreMatcher([]))
+    limits = ReadLimits(skip_binary=True, max_file_bytes=1024)
+    size, tokens = snapshot.compute_totals(snapshot.root, TokenEstimator(), limits)
+    assert size == 8 + 256 * 64 + 20000
+    placeholder = f"[binary file, {8 + 256 * 64} bytes, skipped]"
+    assert tokens == estimate_tokens(placeholder) + TokenEstimator().export_size(str(tmp_path / 'big.txt'), limits)[1]
+    assert tokens < TokenEstimator().file_tokens(str(tmp_path / 'big.txt'))[1]
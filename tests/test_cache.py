@@ -0,0 +1,50 @@
+"""Tests for the size limit of the scan cache."""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from dirxtract_cache import ScanCache  # noqa: E402
+
+def make_files(root, count, size):
+    """Create count files of size bytes, old enough to be cached."""
+    paths = []
+    old = time.time() - 3600
+    for number in range(count):
+        path = root / f"file{number}.txt"
+        path.write_text(str(number) * size, encoding='utf-8')
+        os.utime(path, (old, old))
+        paths.append(str(path))
+    os.utime(root, (old, old))
+    return paths
+
+def blob_bytes(root_cache):
+    return sum(entry.stat().st_size for entry in os.scandir(root_cache.blob_dir))
+
+def test_root_larger_than_the_limit_is_trimmed(tmp_path):
+    source = tmp_path / 'source'
+    source.mkdir()
+    paths = make_files(source, 5, 4000)
+    cache = ScanCache(str(tmp_path / 'cache'), max_mb=10000 / (1024 * 1024))
+    root_cache = cache.open(str(source))
+    # Listed so the entries are not pruned as unreachable on save
+    root_cache.list_dir(str(source))
+    for path in paths + paths[:1]:
+        root_cache.read_file_text(path)
+    root_cache.save()
+    assert blob_bytes(root_cache) <= 10000
+    # The file read last is kept, the least recently used ones are dropped
+    assert sorted(root_cache.files) == sorted([paths[0], paths[4]])
+
+def test_zero_limit_keeps_no_contents(tmp_path):
+    source = tmp_path / 'source'
+    source.mkdir()
+    paths = make_files(source, 3, 1000)
+    root_cache = ScanCache(str(tmp_path / 'cache'), max_mb=0).open(str(source))
+    root_cache.list_dir(str(source))
+    for path in paths:
+        assert root_cache.read_file_text(path)[1] == 1000
+    root_cache.save()
+    assert blob_bytes(root_cache) == 0
+    assert root_cache.files == {}
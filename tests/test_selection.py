@@ -0,0 +1,83 @@
+"""Tests for SelectionModel walks over a snapshot where only some directories have been listed."""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from dirxtract_core import DirectorySnapshot, IgnoreMatcher, SelectionModel  # noqa: E402
+
+def make_tree(root):
+    """Create root/{a/{f1.txt, f2.txt, sub/g.txt}, b/h.txt, top.txt}."""
+    for rel_path in ('a/f1.txt', 'a/f2.txt', 'a/sub/g.txt', 'b/h.txt', 'top.txt'):
+        path = root.joinpath(*rel_path.split('/'))
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(rel_path, encoding='utf-8')
+
+def partial_snapshot(root):
+    """Return a snapshot of root where only the root directory itself has been listed."""
+    snapshot = DirectorySnapshot(str(root), IgnoreMatcher([]))
+    snapshot.list_children(snapshot.root)
+    return snapshot
+
+def child(snapshot, name):
+    return next(node for node in snapshot.root.children if node.name == name)
+
+def exported(snapshot, selection):
+    _, files_dict = snapshot.format_tree('root', selection)
+    return sorted(files_dict)
+
+def test_deselect_directory_that_was_never_listed(tmp_path):
+    make_tree(tmp_path)
+    snapshot = partial_snapshot(tmp_path)
+    assert child(snapshot, 'a').children is None
+    selection = SelectionModel()
+    selection.set_selected(str(tmp_path / 'a'), False)
+
+    lines, files_dict = snapshot.format_tree('root', selection)
+    assert sorted(files_dict) == ['root/b/h.txt', 'root/top.txt']
+    assert not any(line.endswith('a/') for line in lines)
+    assert not selection.is_selected(str(tmp_path / 'a' / 'sub' / 'g.txt'))
+
+def test_reinclude_file_below_deselected_directory(tmp_path):
+    make_tree(tmp_path)
+    snapshot = partial_snapshot(tmp_path)
+    selection = SelectionModel()
+    selection.set_selected(str(tmp_path / 'a'), False)
+    selection.set_selected(str(tmp_path / 'a' / 'sub' / 'g.txt'), True)
+
+    lines, files_dict = snapshot.format_tree('root', selection)
+    assert sorted(files_dict) == ['root/a/sub/g.txt', 'root/b/h.txt', 'root/top.txt']
+    # The deselected directories leading to the file stay in the tree
+    assert any(line.endswith('a/') for line in lines)
+    assert any(line.endswith('sub/') for line in lines)
+    assert not selection.is_selected(str(tmp_path / 'a' / 'f1.txt'))
+
+def test_toggling_ancestor_overrides_older_descendant_marks(tmp_path):
+    make_tree(tmp_path)
+    snapshot = partial_snapshot(tmp_path)
+    # List a/ but not a/sub/, so the walk mixes listed and unlisted directories
+    snapshot.list_children(child(snapshot, 'a'))
+    selection = SelectionModel()
+    selection.set_selected(str(tmp_path / 'a' / 'f1.txt'), False)
+    assert exported(snapshot, selection) == [
+        'root/a/f2.txt', 'root/a/sub/g.txt', 'root/b/h.txt', 'root/top.txt'
+    ]
+
+    # Deselecting and reselecting the ancestor selects everything below it again
+    selection.set_selected(str(tmp_path / 'a'), False)
+    assert exported(snapshot, selection) == ['root/b/h.txt', 'root/top.txt']
+    selection.set_selected(str(tmp_path / 'a'), True)
+    assert exported(snapshot, selection) == [
+        'root/a/f1.txt', 'root/a/f2.txt', 'root/a/sub/g.txt', 'root/b/h.txt', 'root/top.txt'
+    ]
+
+def test_descendant_mark_after_ancestor_toggle_wins(tmp_path):
+    make_tree(tmp_path)
+    snapshot = partial_snapshot(tmp_path)
+    selection = SelectionModel()
+    selection.set_selected(str(tmp_path / 'a'), False)
+    selection.set_selected(str(tmp_path / 'a' / 'sub'), True)
+    selection.set_selected(str(tmp_path / 'a' / 'sub' / 'g.txt'), False)
+    selection.set_selected(str(tmp_path / 'a' / 'f2.txt'), True)
+    assert exported(snapshot, selection) == ['root/a/f2.txt', 'root/b/h.txt', 'root/top.txt']
+    assert child(snapshot, 'a').children is not None